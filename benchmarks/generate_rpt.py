@@ -0,0 +1,88 @@
+import random
+from pathlib import Path
+from src.columns import cols_to_keep, string_cols
+
+
+def make_columns(n_columns: int) -> list[str]:
+    """Column names for a synthetic RPT file.
+
+    Starts with cols_to_keep, so the reduction has real work to do, and pads
+    with BEL_COMPONENTS(n) style columns up to n_columns.
+
+    Args:
+        n_columns (int): Total number of columns
+
+    Returns:
+        list[str]: Column names
+    """
+    columns = ["SPCODE"] + list(cols_to_keep)
+    n = 1
+    while len(columns) < n_columns:
+        name = f"BEL_COMPONENTS({n})"
+        if name not in columns:
+            columns.append(name)
+        n += 1
+    return columns[:n_columns]
+
+
+def _key_value(col: str, row: int, rng: random.Random) -> str:
+    if col == "IFRS17_CONTRACT_ID":
+        return f'"{69410000 + row}S{rng.randint(100000, 999999)}_1_{rng.randint(100, 999)}"'  # noqa
+    if col == "IFRS17_COHORT":
+        return f'"{rng.choice(["2019", "2020", "2021", "2022"])}"'
+    if col == "IFRS17_GROUP_PROFIT":
+        return f'"{rng.choice(["ONEROUS", "NO_SIG_RISK", "REMAINING"])}"'
+    if col == "SPCODE":
+        return str(rng.randint(1, 50))
+    return f'"{rng.choice(["A", "B", "C"])}"'
+
+
+def generate_rpt(
+    file_path: Path,
+    n_rows: int,
+    n_columns: int = 300,
+    malformed_fraction: float = 0.001,
+    seed: int = 0,
+) -> Path:
+    """Write a synthetic Prophet RPT file.
+
+    The file has a few preamble lines, a "!" header with quoted and unquoted
+    names, "*" data rows with quoted key fields and numeric measures, and a
+    share of truncated rows that the readers have to reject.
+
+    Args:
+        file_path (Path): File to write
+        n_rows (int): Number of well-formed data rows
+        n_columns (int): Number of columns
+        malformed_fraction (float): Share of extra truncated rows
+        seed (int): Random seed, the same arguments give the same file
+
+    Returns:
+        Path: The written file
+    """
+    rng = random.Random(seed)
+    columns = make_columns(n_columns)
+    key_cols = [
+        (i, col)
+        for i, col in enumerate(columns)
+        if col in string_cols or col == "SPCODE"
+    ]
+
+    # drawing from a pool of formatted numbers keeps generation fast
+    numbers = [f"{rng.uniform(-1e6, 1e6):.6f}" for _ in range(4096)]
+
+    with open(file_path, "w") as file:
+        file.write("Prophet Professional synthetic output\n\n")
+        file.write(f"Rows: {n_rows}\n")
+        header = [f'"{col}"' if i % 2 else col for i, col in enumerate(columns)]  # noqa
+        file.write("!," + ",".join(header) + "\n")
+
+        for row in range(n_rows):
+            values = rng.choices(numbers, k=len(columns))
+            for i, col in key_cols:
+                values[i] = _key_value(col, row, rng)
+            file.write("*," + ",".join(values) + "\n")
+            if rng.random() < malformed_fraction:
+                file.write("*," + ",".join(values[: len(values) // 2]) + "\n")
+
+    return file_path
@@ -0,0 +1,305 @@
+"""Benchmarks for the io/process hot paths on a synthetic RPT file.
+
+Run from the repository root, e.g.
+
+    python -m benchmarks.run_benchmarks --rows 200000 --columns 300
+
+Every stage runs in a fresh process so its peak RSS is its own. Results are
+written to benchmarks/results/ and compared with the previous run that used
+the same parameters.
+"""
+import argparse
+import json
+import multiprocessing
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+results_dir = Path(__file__).parent / "results"
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of the current process in MB."""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 1024**2
+    except (ImportError, AttributeError):
+        return None
+
+
+def _stream_full(rpt_file: Path, workdir: Path) -> int:
+    from src.io import stream_rpt_file
+
+    return sum(len(chunk) for chunk in stream_rpt_file(rpt_file))
+
+
+def _stream_projected(rpt_file: Path, workdir: Path) -> int:
+    from src.io import stream_rpt_file
+    from src.columns import cols_to_keep, column_dtypes
+    from src.process import get_usecols
+
+    chunks = stream_rpt_file(
+        rpt_file, usecols=get_usecols(cols_to_keep), dtypes=column_dtypes
+    )
+    return sum(len(chunk) for chunk in chunks)
+
+
+def _copy_then_parse(rpt_file: Path, workdir: Path) -> int:
+    from src.io import stream_rpt_file
+    from src.columns import cols_to_keep, column_dtypes
+    from src.process import get_usecols
+
+    local_copy = workdir / "local_copy.rpt"
+    shutil.copy2(rpt_file, local_copy)
+    try:
+        chunks = stream_rpt_file(
+            local_copy, usecols=get_usecols(cols_to_keep), dtypes=column_dtypes
+        )
+        return sum(len(chunk) for chunk in chunks)
+    finally:
+        local_copy.unlink()
+
+
+def _stream_readahead(rpt_file: Path, workdir: Path) -> int:
+    from src.io import stream_rpt_file
+    from src.columns import cols_to_keep, column_dtypes
+    from src.config import readahead_mb
+    from src.process import get_usecols
+
+    chunks = stream_rpt_file(
+        rpt_file,
+        usecols=get_usecols(cols_to_keep),
+        dtypes=column_dtypes,
+        readahead_mb=readahead_mb,
+    )
+    return sum(len(chunk) for chunk in chunks)
+
+
+def _read_rpt(rpt_file: Path, workdir: Path) -> int:
+    from src.io import read_rpt
+
+    reader = read_rpt(rpt_file, chunksize=10_000, on_bad_lines="skip")
+    return sum(len(chunk) for chunk in reader)
+
+
+def _write_chunked_csv(rpt_file: Path, workdir: Path) -> tuple[int, float]:
+    from src.io import stream_rpt_file, write_chunked_csv
+    from src.columns import cols_to_keep, column_dtypes
+    from src.process import get_usecols
+
+    chunks = list(
+        stream_rpt_file(
+            rpt_file, usecols=get_usecols(cols_to_keep), dtypes=column_dtypes
+        )
+    )
+    out_file = workdir / "write_chunked_csv.csv"
+    columns = chunks[0].columns.tolist()
+
+    # only the writing is timed
+    start = time.perf_counter()
+    for i, chunk in enumerate(chunks):
+        write_chunked_csv(
+            chunk,
+            columns,
+            out_file,
+            mode="w" if i == 0 else "a",
+            header=i == 0,
+        )
+    seconds = time.perf_counter() - start
+    return sum(len(chunk) for chunk in chunks), seconds
+
+
+def _process_rpt_file(rpt_file: Path, workdir: Path) -> int:
+    from src.columns import cols_to_keep
+    from src.process import process_rpt_file
+    from src.sidecar import read_sidecar
+
+    local_temp_dir = workdir / "local"
+    local_temp_dir.mkdir(exist_ok=True)
+    metrics = process_rpt_file(
+        (rpt_file, "0", "0", workdir / "out", local_temp_dir, cols_to_keep)
+    )
+    return read_sidecar(Path(metrics["output"]))["row_count"]
+
+
+def _combine_csv_files(rpt_file: Path, workdir: Path) -> int:
+    import pandas as pd
+    from combine import combine_csv_files
+
+    input_dir = next((workdir / "out").glob("#288.*/RUN_*"))
+    combine_csv_files(
+        input_dir, workdir / "combined.csv", workdir / "summary.csv", fast=True
+    )
+    return int(pd.read_csv(workdir / "summary.csv")["row_count"].sum())
+
+
+stages = {
+    "stream_rpt_file": _stream_full,
+    "stream_rpt_file_projected": _stream_projected,
+    # with --source-dir on a network share: copy-then-parse vs readahead
+    "copy_then_parse": _copy_then_parse,
+    "stream_readahead": _stream_readahead,
+    "read_rpt": _read_rpt,
+    "write_chunked_csv": _write_chunked_csv,
+    "process_rpt_file": _process_rpt_file,
+    "combine_csv_files": _combine_csv_files,
+}
+
+
+def _run_stage(name: str, rpt_file: Path, workdir: Path) -> dict:
+    """Run one stage and measure it, called in a fresh worker process."""
+    start = time.perf_counter()
+    result = stages[name](rpt_file, workdir)
+    seconds = time.perf_counter() - start
+    if isinstance(result, tuple):
+        rows, seconds = result
+    else:
+        rows = result
+    return {"stage": name, "rows": rows, "seconds": seconds, "peak_rss_mb": peak_rss_mb()}  # noqa
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def previous_results(params: dict) -> dict | None:
+    """Latest stored results that used the same parameters."""
+    for path in sorted(results_dir.glob("*.json"), reverse=True):
+        with open(path) as file:
+            results = json.load(file)
+        if results["params"] == params:
+            return results
+    return None
+
+
+def run(
+    params: dict,
+    workdir: Path,
+    only: list[str] | None = None,
+    source_dir: Path | None = None,
+) -> dict:
+    from benchmarks.generate_rpt import generate_rpt
+
+    # the RPT can be placed elsewhere, e.g. on a share, to measure reading
+    # it remotely; everything else stays in the local workdir
+    rpt_file = (source_dir or workdir) / "BENCH.rpt"
+    print(f"Generating {rpt_file} ...")
+    generate_rpt(
+        rpt_file,
+        params["rows"],
+        params["columns"],
+        params["malformed_fraction"],
+    )
+    input_mb = rpt_file.stat().st_size / 1024**2
+
+    selected = set(only or stages)
+    if "combine_csv_files" in selected:
+        # combine needs the output of process_rpt_file
+        selected.add("process_rpt_file")
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name in stages:
+        if name not in selected:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(_run_stage, name, rpt_file, workdir).result()
+        result["rows_per_sec"] = result["rows"] / result["seconds"]
+        # throughput relative to the source RPT, comparable across stages
+        result["mb_per_sec"] = input_mb / result["seconds"]
+        results.append(result)
+
+    return {
+        "version": git_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": params,
+        "input_mb": input_mb,
+        "results": results,
+    }
+
+
+def report(current: dict, previous: dict | None):
+    baseline = {}
+    if previous is not None:
+        print(f"Comparing with {previous['version']} ({previous['timestamp']})")  # noqa
+        baseline = {r["stage"]: r for r in previous["results"]}
+
+    print(f"{'stage':<28}{'s':>9}{'rows/s':>12}{'MB/s':>9}{'peak MB':>10}{'vs prev':>10}")  # noqa
+    for r in current["results"]:
+        change = ""
+        if r["stage"] in baseline:
+            before = baseline[r["stage"]]["seconds"]
+            change = f"{(r['seconds'] - before) / before:+.0%}"
+        peak = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"  # noqa
+        print(
+            f"{r['stage']:<28}{r['seconds']:>9.2f}{r['rows_per_sec']:>12.0f}"
+            f"{r['mb_per_sec']:>9.1f}{peak:>10}{change:>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--columns", type=int, default=300)
+    parser.add_argument("--malformed-fraction", type=float, default=0.001)
+    parser.add_argument("--stages", nargs="*", choices=list(stages))
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument(
+        "--source-dir",
+        type=Path,
+        help="folder (e.g. on the network share) to generate the RPT in; "
+        "note the OS may cache it after it is written",
+    )
+    args = parser.parse_args()
+
+    params = {
+        "rows": args.rows,
+        "columns": args.columns,
+        "malformed_fraction": args.malformed_fraction,
+    }
+    if args.source_dir is not None:
+        params["source_dir"] = str(args.source_dir)
+
+    workdir = Path(tempfile.mkdtemp(prefix="mpf_bench_"))
+    try:
+        current = run(params, workdir, args.stages, args.source_dir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if args.source_dir is not None:
+            (args.source_dir / "BENCH.rpt").unlink(missing_ok=True)
+
+    report(current, previous_results(params))
+
+    if not args.no_save:
+        results_dir.mkdir(exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out_file = results_dir / f"{stamp}_{current['version']}.json"
+        with open(out_file, "w") as file:
+            json.dump(current, file, indent=2)
+        print(f"Results written to {out_file}")
+
+
+if __name__ == "__main__":
+    main()
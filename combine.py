@@ -1,93 +1,203 @@
+import os
+import shutil
+import zipfile
 import pandas as pd
 from pathlib import Path
-from src.logger import logger
-from src.io import write_chunked_csv
+from src.logger import logger, setup_logger
+from src.columns import column_dtypes, summary_cols
+from src.sidecar import (
+    read_sidecar,
+    new_stats,
+    update_stats,
+    summary_row,
+    is_complete,
+    temp_path,
+)
+from src.sinks import CsvSink, read_output_chunks, read_output_columns
+from src.chunking import ChunkSizer
+from src.config import chunk_memory_budget_bytes
+
+
+def read_header_line(csv_file: Path) -> bytes:
+    """Read the raw header line of a CSV file."""
+    with open(csv_file, "rb") as file:
+        return file.readline()
+
+
+def append_csv_body(csv_file: Path, out, buffer_size: int = 16 * 1024**2):
+    """
+    Append the raw bytes of a CSV file, without its header line, to an open
+    binary file.
+
+    Args:
+        csv_file: CSV file to copy
+        out: Output file opened in binary mode
+        buffer_size: Size of each copy in bytes
+    """
+    with open(csv_file, "rb") as file:
+        header_line = file.readline()
+        body_start = file.tell()
+
+        # make sure the next file starts on a new line
+        file.seek(0, 2)
+        ends_with_newline = file.tell() == body_start
+        if not ends_with_newline:
+            file.seek(-1, 2)
+            ends_with_newline = file.read(1) == b"\n"
+
+        file.seek(body_start)
+        shutil.copyfileobj(file, out, length=buffer_size)
+        if not ends_with_newline:
+            out.write(header_line[len(header_line.rstrip(b"\r\n")):])
 
 
 def combine_csv_files(
     input_dir: Path,
     output_file: Path,
     summary_file: Path,
-    chunk_size: int = 10_000,
+    chunk_size: int | None = None,
+    suffix: str = ".csv",
+    fast: bool = False,
+    zip_level: int | None = None,
 ):
     """
-    Combine all CSV files in the input directory into a single output file
+    Combine all reduced files in the input directory into a single CSV file
     and generate summary statistics. Files are processed in chunks to manage
     memory usage.
 
     Args:
-        input_dir: Directory containing CSV files to combine
+        input_dir: Directory containing reduced files to combine
         output_file: Path to write the combined file
         summary_file: Path to write the summary statistics
-        chunk_size: Number of rows to process at once
+        chunk_size: Number of rows to process at once, by default sized
+            per file on chunk_memory_budget_bytes
+        suffix: Suffix of the reduced files (".csv", ".parquet" or ".arrow")
+        fast: Copy the raw bytes of CSV files with matching headers instead of
+            parsing and rewriting them. Only the summary columns are parsed.
+        zip_level: Stream the combined CSV into a zip archive at output_file
+            with this DEFLATE level instead of writing it uncompressed
     """
-    # Get all CSV files in the directory
-    csv_files = list(input_dir.glob("*.csv"))
+    # Get all reduced files in the directory
+    csv_files = list(input_dir.glob(f"*{suffix}"))
     if not csv_files:
-        logger.warning(f"No CSV files found in {input_dir}")
+        logger.warning(f"No {suffix} files found in {input_dir}")
         return
 
-    logger.info(f"Found {len(csv_files)} CSV files to combine")
+    logger.info(f"Found {len(csv_files)} {suffix} files to combine")
 
     # Read first file to get columns
-    first_file = pd.read_csv(csv_files[0], nrows=0)
-    output_columns = first_file.columns.tolist()
+    output_columns = read_output_columns(csv_files[0])
     logger.info(f"Using columns: {output_columns}")
 
+    # read known columns with their schema instead of re-inferring types
+    dtypes = {
+        col: dtype
+        for col, dtype in column_dtypes.items()
+        if col in output_columns
+    }
+
+    if fast and suffix != ".csv":
+        logger.warning(f"Fast combine needs CSV files, parsing {suffix} files")  # noqa
+        fast = False
+
+    if fast:
+        header_line = read_header_line(csv_files[0])
+        mismatched = [
+            csv_file.name
+            for csv_file in csv_files
+            if read_header_line(csv_file) != header_line
+        ]
+        if mismatched:
+            logger.warning(
+                f"Headers differ for {mismatched}, falling back to parsing"
+            )
+            fast = False
+
     # Process each file
-    is_first_chunk = True
     total_rows = 0
     summary_data = []
+    # written under a temporary name and renamed once complete
+    tmp_file = temp_path(output_file)
+    archive = None
+    if zip_level is not None:
+        archive = zipfile.ZipFile(
+            tmp_file,
+            "w",
+            compression=zipfile.ZIP_DEFLATED,
+            compresslevel=zip_level,
+        )
+        out = archive.open(output_file.with_suffix(".csv").name, "w", force_zip64=True)  # noqa
+    else:
+        out = open(tmp_file, "wb")
+    if fast:
+        out.write(header_line)
+    else:
+        sink = CsvSink(out, output_columns)
 
     for csv_file in csv_files:
         logger.info(f"Processing {csv_file.name}")
 
+        # statistics written by process_rpt_file when it finished the file
+        is_error_file = not is_complete(csv_file)
+        sidecar = None if is_error_file else read_sidecar(csv_file)
+
         # Initialize summary statistics for this file
-        file_row_count = 0
-        file_lfrc_bel_sum = 0
-        file_lfrc_ra_sum = 0
+        stats = new_stats(summary_cols)
+        sizer = chunk_size or ChunkSizer(chunk_memory_budget_bytes)
+
+        if fast:
+            # copy the file as is and only parse what the summary needs
+            append_csv_body(csv_file, out)
+            if sidecar is not None:
+                stats = sidecar
+                chunks = []
+            else:
+                chunks = read_output_chunks(
+                    csv_file, sizer, columns=summary_cols, dtype=dtypes
+                )
+        else:
+            chunks = read_output_chunks(csv_file, sizer, dtype=dtypes)
 
         # Process file in chunks
-        for chunk in pd.read_csv(csv_file, chunksize=chunk_size):
+        for chunk in chunks:
             # Update summary statistics
-            file_row_count += len(chunk)
-            file_lfrc_bel_sum += chunk["LFRC_BEL"].sum()
-            file_lfrc_ra_sum += chunk["LFRC_RA"].sum()
+            update_stats(stats, chunk)
 
             # Write chunk to output file
-            write_chunked_csv(
-                chunk,
-                output_columns,
-                output_file,
-                mode="w" if is_first_chunk else "a",
-                header=is_first_chunk,
-            )
+            if not fast:
+                sink.write(chunk)
+
+            logger.debug(f"Processed {len(chunk)} rows from {csv_file.name}")
 
-            total_rows += len(chunk)
-            logger.info(f"Processed {len(chunk)} rows from {csv_file.name}")
-            is_first_chunk = False
+        if sidecar is not None:
+            stats["rejected_rows"] = sidecar["rejected_rows"]
 
-        # Check if file might be incomplete
-        is_error_file = file_row_count % 10_000 == 0
+        file_row_count = stats["row_count"]
+        total_rows += file_row_count
 
         # Add file summary to data
         summary_data.append(
             {
-                "file_name": csv_file.name,
-                "row_count": file_row_count,
-                "lfrc_bel_sum": file_lfrc_bel_sum,
-                "lfrc_ra_sum": file_lfrc_ra_sum,
+                **summary_row(csv_file.name, stats),
                 "is_error_file": is_error_file,
             }
         )
 
         if is_error_file:
             msg = (
-                f"File {csv_file.name} has {file_row_count} rows "
-                "(divisible by 10k) - possible incomplete file"
+                f"File {csv_file.name} has no matching manifest "
+                "- incomplete file"
             )
             logger.warning(msg)
 
+    if fast:
+        out.close()
+    else:
+        sink.close()
+    if archive is not None:
+        archive.close()
+    os.replace(tmp_file, output_file)
+
     # Write summary statistics
     summary_df = pd.DataFrame(summary_data)
     summary_df.to_csv(summary_file, index=False)
@@ -98,7 +208,22 @@ def combine_csv_files(
 
 
 if __name__ == "__main__":
-    from src.config import out_dir, run_numbers, runs_of_interest
+    from src.config import (
+        log_dir,
+        log_level,
+        out_dir,
+        run_numbers,
+        runs_of_interest,
+        output_format,
+        fast_combine,
+        combine_to_zip,
+        zip_level,
+    )
+    from src.sinks import get_sink
+    from src.process import write_run_rollup
+
+    setup_logger(logger.name, log_dir, log_level)
+    suffix = get_sink(output_format).suffix
 
     # Combine files for each run number
     for run in runs_of_interest:
@@ -109,6 +234,8 @@ if __name__ == "__main__":
                 continue
 
             output_file = out_dir / f"combined_#288.{run}_RUN_{run_number}.csv"
+            if combine_to_zip:
+                output_file = output_file.with_suffix(".zip")
             summary_file = out_dir / f"summary_#288.{run}_RUN_{run_number}.csv"
 
             if output_file.exists():
@@ -118,5 +245,17 @@ if __name__ == "__main__":
                 )
                 continue
 
+            if output_format == "rollup":
+                # rollups are merged rather than concatenated
+                write_run_rollup(out_dir, run, run_number)
+                continue
+
             logger.info(f"Processing files for #288.{run}_RUN_{run_number}")
-            combine_csv_files(run_dir, output_file, summary_file)
+            combine_csv_files(
+                run_dir,
+                output_file,
+                summary_file,
+                suffix=suffix,
+                fast=fast_combine,
+                zip_level=zip_level if combine_to_zip else None,
+            )
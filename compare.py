@@ -0,0 +1,291 @@
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+from src.logger import logger, setup_logger
+from src.columns import column_dtypes, rollup_keys, compare_measures
+from src.sidecar import is_complete, temp_path
+from src.sinks import read_output_chunks, read_output_columns
+
+contract_keys = ["PRODUCT_CODE", "IFRS17_CONTRACT_ID"]
+group_keys = rollup_keys
+
+
+def partition_outputs(
+    output_files: list[Path],
+    partition_dir: Path,
+    n_partitions: int,
+    measures: list[str],
+    chunk_size: int = 100_000,
+) -> list[Path]:
+    """
+    Hash partition the rows of reduced outputs by contract ID to disk.
+
+    Every chunk is split by a hash of IFRS17_CONTRACT_ID and each piece is
+    appended to the file of its partition, so a contract always ends up in
+    the same partition, whichever run it comes from.
+
+    Args:
+        output_files: Reduced outputs of one run
+        partition_dir: Folder for the partition files
+        n_partitions: Number of partitions
+        measures: Numeric columns to keep
+        chunk_size: Rows read at a time
+
+    Returns:
+        list[Path]: One file per partition, each a sequence of pickled
+            DataFrames (missing if the partition is empty)
+    """
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    partition_files = [
+        partition_dir / f"part{i:04d}.pkl" for i in range(n_partitions)
+    ]
+    handles = {}
+    try:
+        for output_file in output_files:
+            available = read_output_columns(output_file)
+            columns = [
+                col
+                for col in dict.fromkeys(contract_keys + group_keys + measures)
+                if col in available
+            ]
+            string_cols = [col for col in columns if col not in measures]
+            chunks = read_output_chunks(
+                output_file,
+                chunk_size=chunk_size,
+                columns=columns,
+                dtype={col: column_dtypes.get(col, "str") for col in string_cols},  # noqa
+            )
+            for chunk in chunks:
+                hashes = pd.util.hash_pandas_object(
+                    chunk["IFRS17_CONTRACT_ID"], index=False
+                ).to_numpy()
+                partitions = hashes % n_partitions
+                for i, piece in chunk.groupby(partitions, sort=False):
+                    if i not in handles:
+                        handles[i] = open(partition_files[i], "wb")
+                    pickle.dump(piece, handles[i], protocol=pickle.HIGHEST_PROTOCOL)  # noqa
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return partition_files
+
+
+def read_partition(partition_file: Path) -> pd.DataFrame | None:
+    """Load every piece written to a partition file."""
+    if not partition_file.exists():
+        return None
+    pieces = []
+    with open(partition_file, "rb") as file:
+        while True:
+            try:
+                pieces.append(pickle.load(file))
+            except EOFError:
+                break
+    return pd.concat(pieces, ignore_index=True)
+
+
+def _totals(df: pd.DataFrame | None, keys: list[str], measures: list[str]):
+    """Sum the measures of one side by keys, with an empty frame if missing."""
+    if df is None:
+        return pd.DataFrame(columns=keys + measures).set_index(keys)
+    keys = [key for key in keys if key in df.columns]
+    return df.groupby(keys, dropna=False, sort=False)[measures].sum()
+
+
+def deltas(base: pd.DataFrame, run: pd.DataFrame, measures: list[str]):
+    """
+    Outer join the totals of two runs and compute run - base per measure.
+
+    Keys found on one side only count as zero on the other, and are
+    flagged in the `match` column ("both", "base_only" or "run_only").
+    """
+    joined = base.join(run, how="outer", lsuffix="_base", rsuffix="_run")
+    in_base = joined.index.isin(base.index)
+    in_run = joined.index.isin(run.index)
+    for measure in measures:
+        before = joined[f"{measure}_base"].fillna(0.0)
+        after = joined[f"{measure}_run"].fillna(0.0)
+        joined[f"{measure}_delta"] = after - before
+    joined["match"] = "both"
+    joined.loc[in_base & ~in_run, "match"] = "base_only"
+    joined.loc[in_run & ~in_base, "match"] = "run_only"
+    return joined
+
+
+def compare_partition(args) -> tuple[Path, pd.DataFrame]:
+    """
+    Join one partition of both runs.
+
+    Args:
+        args: (base partition, run partition, contract output, measures)
+
+    Returns:
+        tuple: The per-contract deltas file and the group totals of both
+            sides for this partition
+    """
+    base_file, run_file, out_file, measures = args
+    base = read_partition(base_file)
+    run = read_partition(run_file)
+
+    contracts = deltas(
+        _totals(base, contract_keys, measures),
+        _totals(run, contract_keys, measures),
+        measures,
+    )
+    contracts.reset_index().to_csv(out_file, index=False)
+
+    # groups are summed per side; deltas are taken after all partitions
+    # are merged
+    groups = pd.concat(
+        {
+            "base": _totals(base, group_keys, measures),
+            "run": _totals(run, group_keys, measures),
+        },
+        axis=1,
+    )
+    return out_file, groups
+
+
+def compare_runs(
+    base_parts: list[Path],
+    run_files: list[Path],
+    contracts_file: Path,
+    groups_file: Path,
+    measures: list[str] = compare_measures,
+    workers: int = os.cpu_count() or 4,
+    temp_dir: Path | None = None,
+):
+    """
+    Compare a sensitivity run with the base run, contract by contract.
+
+    The sensitivity run is hash partitioned by contract ID to disk like the
+    base run, then the partitions are joined in parallel, so memory is
+    bound by the size of a partition rather than a run. Writes the measures
+    of both runs and their delta per contract (PRODUCT_CODE,
+    IFRS17_CONTRACT_ID) and per group (the rollup keys).
+
+    Args:
+        base_parts: Partitions of the base run from partition_outputs, made
+            once and shared by all runs compared with it
+        run_files: Reduced outputs of the sensitivity run
+        contracts_file: CSV of the per-contract deltas
+        groups_file: CSV of the per-group deltas
+        measures: Numeric columns to compare, as partitioned
+        workers: Number of partitions joined at once
+        temp_dir: Folder for the partition files, by default the system
+            temp folder
+    """
+    with tempfile.TemporaryDirectory(dir=temp_dir) as work_dir:
+        work_dir = Path(work_dir)
+        logger.info(f"Partitioning {len(run_files)} run outputs")
+        run_parts = partition_outputs(
+            run_files, work_dir / "run", len(base_parts), measures
+        )
+
+        tasks = [
+            (base_part, run_part, work_dir / f"contracts{i:04d}.csv", measures)
+            for i, (base_part, run_part) in enumerate(zip(base_parts, run_parts))  # noqa
+            if base_part.exists() or run_part.exists()
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(compare_partition, tasks))
+        logger.info(f"Joined {len(tasks)} partitions")
+
+        # per contract: concatenate the partitions, keeping one header
+        tmp_file = temp_path(contracts_file)
+        with open(tmp_file, "wb") as out:
+            for i, (part_file, _) in enumerate(results):
+                with open(part_file, "rb") as part:
+                    if i > 0:
+                        part.readline()
+                    shutil.copyfileobj(part, out, length=16 * 1024**2)
+        os.replace(tmp_file, contracts_file)
+
+    # per group: the group totals of the partitions are small, merge them
+    # and take the deltas
+    group_totals = pd.concat([groups for _, groups in results])
+    group_totals = group_totals.groupby(
+        level=list(range(group_totals.index.nlevels)), dropna=False
+    ).sum(min_count=1)
+    groups = deltas(
+        group_totals["base"].dropna(how="all"),
+        group_totals["run"].dropna(how="all"),
+        measures,
+    )
+    tmp_file = temp_path(groups_file)
+    groups.reset_index().to_csv(tmp_file, index=False)
+    os.replace(tmp_file, groups_file)
+
+    logger.info(f"Contract deltas written to {contracts_file}")
+    logger.info(f"Group deltas written to {groups_file}")
+
+
+if __name__ == "__main__":
+    from src.config import (
+        log_dir,
+        log_level,
+        out_dir,
+        local_temp_dir,
+        run_numbers,
+        runs_of_interest,
+        output_format,
+        compare_base_run,
+        compare_partitions,
+        max_workers,
+    )
+    from src.sinks import get_sink
+
+    setup_logger(logger.name, log_dir, log_level)
+    if output_format == "rollup":
+        raise SystemExit(
+            "compare.py joins outputs by contract, rollup outputs only hold "
+            "group totals; reduce with output_format csv, parquet or arrow"
+        )
+    suffix = get_sink(output_format).suffix
+
+    def complete_outputs(run: str, run_number: str) -> list[Path]:
+        run_dir = out_dir / f"#288.{run}" / f"RUN_{run_number}"
+        files = sorted(run_dir.glob(f"*{suffix}"))
+        return [file for file in files if is_complete(file)]
+
+    local_temp_dir.mkdir(parents=True, exist_ok=True)
+    for run_number in run_numbers:
+        base_files = complete_outputs(compare_base_run, run_number)
+        if not base_files:
+            logger.warning(
+                f"No outputs for #288.{compare_base_run} RUN_{run_number}, skipping..."  # noqa
+            )
+            continue
+
+        # the base run is partitioned once for all runs compared with it
+        with tempfile.TemporaryDirectory(dir=local_temp_dir) as base_dir:
+            logger.info(f"Partitioning {len(base_files)} base outputs")
+            base_parts = partition_outputs(
+                base_files,
+                Path(base_dir),
+                compare_partitions,
+                compare_measures,
+            )
+
+            for run in runs_of_interest:
+                if run == compare_base_run:
+                    continue
+                run_files = complete_outputs(run, run_number)
+                if not run_files:
+                    logger.warning(f"No outputs for #288.{run} RUN_{run_number}, skipping...")  # noqa
+                    continue
+
+                name = f"#288.{run}_vs_#288.{compare_base_run}_RUN_{run_number}"  # noqa
+                logger.info(f"Comparing {name}")
+                compare_runs(
+                    base_parts,
+                    run_files,
+                    out_dir / f"compare_{name}_contracts.csv",
+                    out_dir / f"compare_{name}_groups.csv",
+                    workers=max_workers,
+                    temp_dir=local_temp_dir,
+                )
@@ -0,0 +1,44 @@
+# build the row indexes of the RPT files of the runs of interest
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.config import (
+    log_dir,
+    log_level,
+    run_numbers,
+    runs_of_interest,
+    index_dir,
+    index_every,
+    discovery_workers,
+)
+from src.logger import logger, setup_logger
+from src.planner import get_results_dir, list_rpt_files
+from src.rpt_index import get_index
+
+if __name__ == "__main__":
+    setup_logger(logger.name, log_dir, log_level)
+
+    if index_dir is None:
+        raise SystemExit("Set index_dir in src/config.py to build indexes")
+
+    rpt_files = [
+        rpt_file
+        for run in runs_of_interest
+        for run_number in run_numbers
+        for rpt_file, _ in list_rpt_files(get_results_dir(run, run_number))
+    ]
+    logger.info(f"Indexing {len(rpt_files)} RPT files into {index_dir}")
+
+    # the scan is I/O bound and numpy releases the GIL, so threads keep
+    # several reads in flight on the share
+    with ThreadPoolExecutor(max_workers=discovery_workers) as executor:
+        futures = {
+            executor.submit(get_index, rpt_file, index_dir, index_every): rpt_file  # noqa
+            for rpt_file in rpt_files
+        }
+        total_rows = 0
+        for future in as_completed(futures):
+            try:
+                total_rows += future.result().row_count
+            except Exception as e:
+                logger.error(f"Failed to index {futures[future]}: {e}")
+
+    logger.info(f"Indexed {total_rows} rows")
@@ -1,57 +1,220 @@
-from src.logger import logger
-from src.columns import cols_to_keep
+import multiprocessing
+import queue
+import time
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from src.logger import (
+    logger,
+    configure_worker,
+    start_queue_logging,
+    stop_queue_logging,
+)
 from src.config import (
-    input_dir,
     local_temp_dir,
     out_dir,
-    run_numbers,
-    runs_of_interest,
-    is_omp,
+    executor_type,
+    max_workers,
+    log_dir,
+    log_level,
+    output_format,
+    split_threshold_bytes,
+    split_parts,
+    use_local_copy,
+    copy_workers,
+    staging_budget_bytes,
+    catalog_file,
+    cache_dir,
+)
+from src.catalog import Catalog
+from src.staging import Stager
+from src.planner import build_tasks, log_plan
+from src.metrics import aggregate, write_report
+from src.process import (
+    process_rpt_file,
+    plan_rpt_parts,
+    process_rpt_part,
+    stitch_rpt_parts,
+    remove_rpt_parts,
+    write_run_rollup,
+    get_out_file,
+    rpt_cache,
 )
-from src.process import process_rpt_file
-
-# create an output dir
-out_dir.mkdir(parents=True, exist_ok=True)
-local_temp_dir.mkdir(parents=True, exist_ok=True)
 
-# ensure the temp dir is empty
-for file in local_temp_dir.glob("*"):
-    file.unlink()
 
-all_tasks = []
+def get_executor(
+    kind: str = executor_type, workers: int = max_workers, log_queue=None
+):
+    """Create the executor used to run process_rpt_file.
 
-for run in runs_of_interest:
-    for run_number in run_numbers:
-        if is_omp:
-            run_type = "NB" if run_number == "250" else "CLS"
+    Args:
+        kind (str): "process" for parsing, "thread" for I/O-bound runs
+        workers (int): Number of workers
+        log_queue: Queue that worker processes send their log records to
 
-            results_dir = (
-                input_dir / f"#288.{run}" / run_type / run_number / f"RUN_{run_number}"  # noqa
-            )
-        else:
-            results_dir = input_dir / f"#288.{run}" / f"RUN_{run_number}"
-        rpts = list(results_dir.glob("*.rpt"))
-        logger.info(f"Folder: {results_dir} - Found {len(rpts)} RPT files")
+    Returns:
+        Executor: A ProcessPoolExecutor or ThreadPoolExecutor
+    """
+    if kind == "process":
+        if log_queue is None:
+            return ProcessPoolExecutor(max_workers=workers)
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=configure_worker,
+            initargs=(log_queue, logger.name, log_level),
+        )
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unknown executor type: {kind}")
 
-        for rpt_file in rpts:
-            out_path = out_dir / f"#288.{run}" / f"RUN_{run_number}"
-            out_file = out_path / f"{rpt_file.stem}.csv"
 
-            if out_file.exists():
-                logger.info(
-                    f"skipping #288.{run} RUN_{run_number} {rpt_file.name}"  # noqa
-                )
-                continue
+def main():
+    # workers only put records on the queue, a listener thread in this
+    # process writes them to the log file and console
+    if executor_type == "process":
+        log_queue = multiprocessing.Queue()
+    else:
+        log_queue = queue.Queue()
+    listener = start_queue_logging(log_queue, logger.name, log_dir, log_level)
+    try:
+        run(log_queue)
+    finally:
+        stop_queue_logging(listener)
 
-            all_tasks.append(
-                (rpt_file, run, run_number, out_dir, local_temp_dir, cols_to_keep)  # noqa
-            )
 
-if __name__ == "__main__":
+def run(log_queue):
     logger.info("Starting MPF reduction process")
-    from concurrent.futures import ThreadPoolExecutor
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        executor.map(process_rpt_file, all_tasks)
+    # create an output dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    local_temp_dir.mkdir(parents=True, exist_ok=True)
+
+    if cache_dir is not None and cache_dir.resolve() == local_temp_dir.resolve():  # noqa
+        raise ValueError(
+            "cache_dir must differ from local_temp_dir, which is emptied "
+            "at the start of every run"
+        )
+
+    # ensure the temp dir is empty, leaving folders such as a cache alone
+    for file in local_temp_dir.glob("*"):
+        if file.is_file():
+            file.unlink()
+
+    start = time.perf_counter()
+    catalog = Catalog(catalog_file)
+    all_tasks = build_tasks(catalog)
+    log_plan(all_tasks, max_workers)
+    logger.info(
+        f"Processing {len(all_tasks)} files with {max_workers} {executor_type} workers"  # noqa
+    )
+
+    failed = []
+    all_metrics = []
+    tasks_by_file = {task[0]: task for task, _ in all_tasks}
+    stager = Stager(
+        local_temp_dir, staging_budget_bytes, copy_workers, rpt_cache
+    )
+    with catalog, stager, get_executor(log_queue=log_queue) as executor:
+        # future -> (kind, rpt_file, task or part tasks)
+        pending = {}
+        remaining_parts = {}
+
+        # largest first, the pool hands the next file to whichever worker
+        # frees up first
+        for task, size in all_tasks:
+            rpt_file = task[0]
+            if size >= split_threshold_bytes:
+                part_tasks = plan_rpt_parts(task, split_parts)
+                remaining_parts[rpt_file] = len(part_tasks)
+                for part_task in part_tasks:
+                    future = executor.submit(process_rpt_part, part_task)
+                    pending[future] = ("part", rpt_file, part_tasks)
+            elif use_local_copy:
+                # parse once the copy is staged, see below
+                pending[stager.stage(rpt_file)] = ("copy", rpt_file, task)
+            else:
+                future = executor.submit(process_rpt_file, task)
+                pending[future] = ("file", rpt_file, task)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, rpt_file, payload = pending.pop(future)
+                _, run, run_number, *_ = tasks_by_file[rpt_file]
+                out_file = get_out_file(out_dir, run, run_number, rpt_file)
+                try:
+                    metrics = future.result()
+                    all_metrics.append(metrics)
+                    if kind in ("file", "stitch"):
+                        catalog.record_output(out_file, rpt_file, metrics)
+                except Exception as e:
+                    logger.error(f"Failed to process {rpt_file}: {e}")
+                    if rpt_file not in failed:
+                        failed.append(rpt_file)
+                        catalog.record(out_file, "failed", rpt_file, error=str(e))  # noqa
+
+                if kind == "copy":
+                    if rpt_file not in failed:
+                        # parse the copy the Stager made for this file
+                        local_copy = Path(metrics["output"])
+                        parse = executor.submit(process_rpt_file, payload, local_copy)  # noqa
+                        pending[parse] = ("file", rpt_file, payload)
+                elif kind == "file" and use_local_copy:
+                    # the local copy is gone, let the next file be staged
+                    stager.release(rpt_file)
+                elif kind == "part":
+                    # stitch a split file once all of its parts are done
+                    remaining_parts[rpt_file] -= 1
+                    if remaining_parts[rpt_file] == 0:
+                        if rpt_file in failed:
+                            remove_rpt_parts(out_file.parent / "_parts", out_file.stem)  # noqa
+                        else:
+                            stitch = executor.submit(stitch_rpt_parts, payload)
+                            pending[stitch] = ("stitch", rpt_file, payload)
+                elif kind == "stitch" and rpt_file in failed:
+                    remove_rpt_parts(out_file.parent / "_parts", out_file.stem)
+
+    if failed:
+        logger.error(f"{len(failed)} of {len(all_tasks)} files failed")
+        for rpt_file in failed:
+            logger.error(f"Failed: {rpt_file}")
+
+    if output_format == "rollup":
+        # one compact rollup per run replaces the combine and zip steps;
+        # runs with failed files are left for the next run
+        failed_runs = {
+            (task[1], task[2]) for task, _ in all_tasks if task[0] in failed
+        }
+        for run, run_number in sorted(
+            {(task[1], task[2]) for task, _ in all_tasks} - failed_runs
+        ):
+            write_run_rollup(out_dir, run, run_number)
+
+    # machine readable timings of every stage, summed over all files
+    wall_seconds = time.perf_counter() - start
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_file = write_report(
+        out_dir / f"run_metrics_{stamp}.json",
+        all_metrics,
+        wall_seconds,
+        workers=max_workers,
+        executor=executor_type,
+        failed=[str(rpt_file) for rpt_file in failed],
+    )
+    for stage, totals in aggregate(all_metrics).items():
+        logger.info(
+            f"{stage}: {totals['seconds']:.0f}s, "
+            f"{totals['bytes'] / 1024**3:.2f} GB, {totals['rows']} rows"
+        )
+    logger.info(f"Metrics written to {report_file}")
 
     logger.info("MPF reduction process completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from src.logger import logger
+
+
+class RptCache:
+    """Persistent local cache of RPT files, shared by runs and workers.
+
+    Entries are keyed by the source path, size and mtime, so a retry or a
+    reduction with different columns reads the local copy instead of the
+    share. The total size is kept under
+    `max_bytes` by evicting the least recently used entries.
+
+    Safe for concurrent use by threads and processes: copies are written
+    under a temporary name unique to the writer and renamed into place, and
+    a lock file makes sure usually only one of them fetches a given file at
+    a time (a lock older than lock_timeout is taken over, in which case both
+    copies complete and the last rename wins).
+
+    Entries fetched with `pin=True` are not evicted until they are unpinned,
+    e.g. files staged for parsing that no worker has read yet. Pins are
+    counted per instance, so the process that stages the files has to be
+    the one that evicts, as in main.py.
+
+    Args:
+        cache_dir (Path): Local directory holding the cached files
+        max_bytes (int): Maximum total size of the cache
+        lock_timeout (float): Seconds after which a lock is considered left
+            behind by a crashed worker
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int, lock_timeout: float = 2 * 3600):  # noqa
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._pins = {}  # entry -> number of holders
+        self._pins_lock = threading.Lock()
+
+    def key(self, rpt_file: Path) -> str:
+        """Cache key of the current version of a source file."""
+        stat = rpt_file.stat()
+        identity = f"{rpt_file}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.rpt"
+
+    def fetch(self, rpt_file: Path, pin: bool = False) -> tuple[Path, bool]:
+        """Return a local copy of an RPT file, copying it if not cached.
+
+        Args:
+            rpt_file (Path): The source RPT file
+            pin (bool): Keep the entry from being evicted until `unpin`
+
+        Returns:
+            tuple[Path, bool]: The cached copy and whether it was a hit
+        """
+        entry = self.path(self.key(rpt_file))
+        if pin:
+            self._pin(entry)
+        try:
+            return self._fetch(rpt_file, entry)
+        except BaseException:
+            if pin:
+                self.unpin(entry)
+            raise
+
+    def _pin(self, entry: Path):
+        with self._pins_lock:
+            self._pins[entry] = self._pins.get(entry, 0) + 1
+
+    def unpin(self, entry: Path):
+        """Let a pinned entry be evicted again."""
+        with self._pins_lock:
+            count = self._pins.pop(entry, 0) - 1
+            if count > 0:
+                self._pins[entry] = count
+
+    def _pinned(self) -> set[Path]:
+        with self._pins_lock:
+            return set(self._pins)
+
+    def _fetch(self, rpt_file: Path, entry: Path) -> tuple[Path, bool]:
+        while True:
+            if self._touch(entry):
+                logger.debug(f"Using cached copy of {rpt_file}")
+                return entry, True
+            if self._lock(entry):
+                break
+            # another worker is fetching the same file
+            time.sleep(0.5)
+
+        try:
+            if self._touch(entry):
+                return entry, True
+            size = rpt_file.stat().st_size
+            self.evict(self.max_bytes - size, keep=entry)
+
+            logger.info(f"Caching {rpt_file} as {entry.name}")
+            # unique per writer, in case a slow copy's lock was taken over
+            tmp_entry = entry.with_name(
+                f"{entry.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            )
+            try:
+                shutil.copyfile(rpt_file, tmp_entry)
+                os.replace(tmp_entry, entry)
+            except BaseException:
+                tmp_entry.unlink(missing_ok=True)
+                raise
+            return entry, False
+        finally:
+            self._unlock(entry)
+
+    def _touch(self, entry: Path) -> bool:
+        """Mark an entry as just used, False if it is not cached."""
+        try:
+            os.utime(entry)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _lock(self, entry: Path) -> bool:
+        lock_file = entry.with_name(f"{entry.name}.lock")
+        try:
+            os.close(os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - lock_file.stat().st_mtime > self.lock_timeout:
+                    logger.warning(f"Removing stale cache lock {lock_file}")
+                    lock_file.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+            return False
+
+    def _unlock(self, entry: Path):
+        entry.with_name(f"{entry.name}.lock").unlink(missing_ok=True)
+
+    def evict(self, target_bytes: int, keep: Path | None = None):
+        """Remove least recently used entries until at most `target_bytes`
+        are cached.
+
+        Pinned entries and entries that can't be removed, e.g. because they
+        are open on Windows, are skipped.
+
+        Args:
+            target_bytes (int): Size to shrink the cache to
+            keep (Path | None): An entry that must not be removed
+        """
+        entries = []
+        for entry in self.cache_dir.glob("*.rpt"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted by another worker
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        pinned = self._pinned()
+        for _, size, entry in sorted(entries):
+            if total <= target_bytes:
+                break
+            if entry == keep or entry in pinned:
+                continue
+            try:
+                entry.unlink()
+                logger.info(f"Evicted {entry.name} from the RPT cache")
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue  # still being read
+            total -= size
@@ -0,0 +1,221 @@
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+from src.sidecar import read_sidecar, is_complete, summary_row
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    output TEXT PRIMARY KEY,
+    source TEXT,
+    run TEXT NOT NULL,
+    run_number TEXT NOT NULL,
+    product TEXT NOT NULL,
+    status TEXT NOT NULL,
+    row_count INTEGER,
+    rejected_rows INTEGER,
+    seconds REAL,
+    stages TEXT,
+    error TEXT,
+    updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_run ON files (run, run_number);
+CREATE INDEX IF NOT EXISTS files_status ON files (status);
+CREATE TABLE IF NOT EXISTS sums (
+    output TEXT NOT NULL REFERENCES files (output) ON DELETE CASCADE,
+    measure TEXT NOT NULL,
+    total REAL,
+    PRIMARY KEY (output, measure)
+);
+"""
+
+
+def run_of(out_file: Path) -> tuple[str, str]:
+    """Run and run number of an output in out_dir/#288.<run>/RUN_<number>."""
+    run = out_file.parent.parent.name.removeprefix("#288.")
+    run_number = out_file.parent.name.removeprefix("RUN_")
+    return run, run_number
+
+
+class Catalog:
+    """SQLite record of every reduced file, updated as files finish.
+
+    One row per output with its run, product, status ("complete" or
+    "failed"), row counts, timings and error, plus the measure sums in a
+    separate table. Reports and clean ups query it instead of walking the
+    output folders on the share. Only main.py writes to it while reducing,
+    so there is a single writer.
+
+    Keep the database on local disk: SQLite locking is unreliable on
+    network shares.
+
+    Args:
+        db_file (Path): The SQLite database, created if it doesn't exist
+    """
+
+    def __init__(self, db_file: Path):
+        self.db_file = db_file
+        self._db = sqlite3.connect(db_file)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(schema)
+
+    def record(
+        self,
+        out_file: Path,
+        status: str,
+        rpt_file: Path | None = None,
+        stats: dict | None = None,
+        metrics: dict | None = None,
+        error: str | None = None,
+    ):
+        """Add or replace the entry of an output.
+
+        Args:
+            out_file (Path): The reduced output
+            status (str): "complete" or "failed"
+            rpt_file (Path | None): The source RPT file
+            stats (dict | None): Statistics from the sidecar, see new_stats
+            metrics (dict | None): Timings, see FileMetrics.to_dict
+            error (str | None): Why the file failed
+        """
+        run, run_number = run_of(out_file)
+        # product codes may contain dots, so take the stem of the source
+        source = Path(rpt_file) if rpt_file is not None else out_file
+        product = source.stem
+        stats = stats or {}
+        stages = (metrics or {}).get("stages")
+        seconds = (metrics or {}).get("seconds")
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(out_file),
+                    str(rpt_file) if rpt_file is not None else None,
+                    run,
+                    run_number,
+                    product,
+                    status,
+                    stats.get("row_count"),
+                    stats.get("rejected_rows"),
+                    seconds,
+                    json.dumps(stages) if stages is not None else None,
+                    error,
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+            self._db.execute("DELETE FROM sums WHERE output = ?", (str(out_file),))  # noqa
+            self._db.executemany(
+                "INSERT INTO sums VALUES (?, ?, ?)",
+                [
+                    (str(out_file), measure, total)
+                    for measure, total in stats.get("sums", {}).items()
+                ],
+            )
+
+    def record_output(self, out_file: Path, rpt_file: Path, metrics: dict):
+        """Record a finished output, with the statistics of its sidecar."""
+        self.record(out_file, "complete", rpt_file, read_sidecar(out_file), metrics)  # noqa
+
+    def scan(self, out_dir: Path, suffix: str, missing_only: bool = False):
+        """Add the outputs already on disk, e.g. from before the catalog.
+
+        Outputs with a valid manifest are complete, everything else
+        (including leftover temporary files) is recorded as failed.
+
+        Args:
+            out_dir (Path): Output folder of the reduction
+            suffix (str): Suffix of the reduced outputs
+            missing_only (bool): Only add outputs the catalog doesn't know,
+                e.g. ones that were skipped because they were up to date
+        """
+        known = self.known() if missing_only else set()
+        for run_dir in sorted(out_dir.glob("#288.*/RUN_*")):
+            for out_file in sorted(run_dir.glob(f"*{suffix}")):
+                if str(out_file) in known:
+                    continue
+                if is_complete(out_file):
+                    stats = read_sidecar(out_file)
+                    source = stats.get("source", {}).get("path")
+                    self.record(out_file, "complete", source, stats)
+                else:
+                    self.record(out_file, "failed", error="no valid manifest")
+            for tmp_file in sorted(run_dir.glob(f"*{suffix}.tmp")):
+                out_file = tmp_file.with_name(tmp_file.name.removesuffix(".tmp"))  # noqa
+                if not out_file.exists() and str(out_file) not in known:
+                    self.record(out_file, "failed", error="unfinished")
+
+    def known(self) -> set[str]:
+        """Outputs the catalog has an entry for."""
+        return {row[0] for row in self._db.execute("SELECT output FROM files")}  # noqa
+
+    def is_empty(self) -> bool:
+        return self._db.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None  # noqa
+
+    def files(
+        self,
+        status: str | None = None,
+        run: str | None = None,
+        run_number: str | None = None,
+    ) -> list[sqlite3.Row]:
+        """Entries of the catalog, optionally filtered.
+
+        Args:
+            status (str | None): Only files with this status
+            run (str | None): Only files of this run
+            run_number (str | None): Only files of this run number
+
+        Returns:
+            list[sqlite3.Row]: Matching entries, by run and output
+        """
+        filters = {"status": status, "run": run, "run_number": run_number}
+        where = [f"{col} = ?" for col, value in filters.items() if value is not None]  # noqa
+        query = "SELECT * FROM files"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY run, run_number, output"
+        values = [value for value in filters.values() if value is not None]
+        return self._db.execute(query, values).fetchall()
+
+    def remove(self, out_file: Path):
+        """Forget an output, e.g. after it was deleted."""
+        with self._db:
+            self._db.execute("DELETE FROM files WHERE output = ?", (str(out_file),))  # noqa
+
+    def summary(self) -> pd.DataFrame:
+        """Per file summary of all runs, as written to all_runs.csv.
+
+        Returns:
+            pd.DataFrame: file_name, row_count, <measure>_sum, rejected_rows,
+                is_error_file and run_info per file
+        """
+        sums = {}
+        for row in self._db.execute("SELECT * FROM sums ORDER BY output"):
+            sums.setdefault(row["output"], {})[row["measure"]] = row["total"]
+
+        rows = []
+        for entry in self.files():
+            file_name = Path(entry["output"]).name
+            if entry["status"] == "complete":
+                stats = {
+                    "row_count": entry["row_count"],
+                    "rejected_rows": entry["rejected_rows"],
+                    "sums": sums.get(entry["output"], {}),
+                }
+                row = {**summary_row(file_name, stats), "is_error_file": False}  # noqa
+            else:
+                row = {"file_name": file_name, "is_error_file": True}
+            row["run_info"] = f"summary_#288.{entry['run']}_RUN_{entry['run_number']}"  # noqa
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
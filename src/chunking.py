@@ -0,0 +1,83 @@
+import pandas as pd
+from src.logger import logger
+
+
+class ChunkSizer:
+    """Pick the number of rows per chunk from a memory budget.
+
+    Starts with a small probe chunk; once it has been built, its measured
+    size per row sets the chunk size for the rest of the file, so wide files
+    get small chunks and narrow files large ones.
+
+    Args:
+        budget_bytes (int): Memory one chunk may use
+        initial_rows (int): Rows in the probe chunk
+        min_rows (int): Smallest chunk size
+        max_rows (int): Largest chunk size
+        overhead (float): Peak memory while building a chunk (parsed strings,
+            the DataFrame and transformed copies) relative to the final
+            DataFrame
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int,
+        initial_rows: int = 1_000,
+        min_rows: int = 1_000,
+        max_rows: int = 1_000_000,
+        overhead: float = 3.0,
+    ):
+        self.budget_bytes = budget_bytes
+        self.rows = initial_rows
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.overhead = overhead
+        self.bytes_per_row = None
+
+    @property
+    def measured(self) -> bool:
+        return self.bytes_per_row is not None
+
+    def observe(self, chunk: pd.DataFrame) -> int:
+        """Size the next chunks on a chunk that was just built.
+
+        Args:
+            chunk (pd.DataFrame): A chunk, typically the first of a file
+
+        Returns:
+            int: Rows per chunk from now on
+        """
+        if len(chunk) == 0:
+            return self.rows
+        memory = chunk.memory_usage(index=False, deep=True).sum()
+        return self.size_for(memory / len(chunk))
+
+    def size_for(self, bytes_per_row: float) -> int:
+        """Size the chunks on a known (or estimated) size per row."""
+        self.bytes_per_row = max(bytes_per_row, 1.0)
+        rows = self.budget_bytes / (self.bytes_per_row * self.overhead)
+        self.rows = int(min(max(rows, self.min_rows), self.max_rows))
+        logger.debug(
+            f"{self.bytes_per_row:.0f} bytes per row, "
+            f"using chunks of {self.rows} rows"
+        )
+        return self.rows
+
+
+def worker_budget_bytes(
+    chunk_budget_bytes: int, pool_budget_bytes: int | None, workers: int
+) -> int:
+    """Memory budget for the chunks of one worker.
+
+    Args:
+        chunk_budget_bytes (int): Budget per worker
+        pool_budget_bytes (int | None): Optional budget for the whole pool,
+            shared equally by the workers
+        workers (int): Number of workers in the pool
+
+    Returns:
+        int: The smaller of the two budgets per worker
+    """
+    if pool_budget_bytes is None:
+        return chunk_budget_bytes
+    return min(chunk_budget_bytes, pool_budget_bytes // max(workers, 1))
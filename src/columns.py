@@ -1,3 +1,5 @@
+from src.config import is_omp
+
 cols_to_keep = [
     "IFRS17_CONTRACT_ID",
     "IFRS17_COHORT",
@@ -42,3 +44,50 @@ cols_to_keep = [
     "LFRC_BEL_COMPONENTS_I17(36)",
     "REPORTING_DATA_DIMENSION(4)",
 ]
+
+
+# Schema used when parsing RPT chunks and reading the reduced outputs back.
+# Key columns are kept as strings; everything else in cols_to_keep is numeric.
+string_cols = [
+    "IFRS17_CONTRACT_ID",
+    "IFRS17_COHORT",
+    "IFRS17_GROUP_PROFIT",
+    "REPORTING_DATA_DIMENSION(4)",
+]
+
+column_dtypes = {
+    col: "str" if col in string_cols else "float64" for col in cols_to_keep
+}
+
+# numeric columns summed per file while reducing, reported by combine/summary
+summary_cols = ["LFRC_BEL", "LFRC_RA"]
+
+# with output_format = "rollup", only the sum and count of these measures
+# per group of these keys is written, see RollupSink in src/sinks.py
+rollup_keys = [
+    "PRODUCT_CODE",
+    "IFRS17_COHORT",
+    "IFRS17_GROUP_PROFIT",
+    "REPORTING_DATA_DIMENSION(4)",
+]
+rollup_measures = [col for col in cols_to_keep if column_dtypes[col] != "str"]
+
+# measures compared per contract and per group by compare.py
+compare_measures = ["LFRC_BEL", "LFRC_RA", "NO_POLS_MS(1:1)"]
+
+# Transforms applied to every parsed chunk, in order, see src/transforms.py.
+# Columns they add are written before cols_to_keep. "{product_code}" is
+# replaced by the stem of the RPT file.
+chunk_transforms = [
+    {"op": "constant", "column": "PRODUCT_CODE", "value": "{product_code}"},
+]
+if not is_omp:
+    # 69410S705341618_1_477 -> 69410S705341618, 1, 477
+    chunk_transforms.append(
+        {
+            "op": "split",
+            "column": "IFRS17_CONTRACT_ID",
+            "sep": "_",
+            "into": ["POLICY_NUMBER", "SEQUENCE_NUMBER", "PLAN_CODE"],
+        }
+    )
@@ -1,8 +1,80 @@
+import os
 from pathlib import Path
 
 is_omp = True
 use_local_copy = True
 
+# with use_local_copy, copier threads stage upcoming RPTs into local_temp_dir
+# while earlier ones are parsed, keeping at most this many bytes staged
+copy_workers = 2
+staging_budget_bytes = 64 * 1024**3
+
+# with use_local_copy, keep the local copies in a persistent cache instead of
+# deleting them, so retries and reductions with other cols_to_keep skip the
+# network transfer; least recently used files are evicted above the cap.
+# None to disable, e.g. Path(R"C:\Temp\MPF_Cache")
+cache_dir = None
+cache_max_bytes = 500 * 1024**3
+
+# without use_local_copy, RPTs are parsed straight from the share with a
+# background thread reading this many MB ahead of the parser
+readahead_mb = 64
+
+# record a content hash of every RPT, so a re-run that only touches a file's
+# mtime does not force it to be reduced again (costs a full read per file)
+hash_sources = False
+
+# threads used to list the run folders on the share
+discovery_workers = 16
+# rough parse speed per worker, only used for the time estimate of a run
+expected_mb_per_sec = 40
+
+# row indexes of the RPTs (offset of every index_every-th row, row and
+# malformed row counts), built by index.py. When present, split files are
+# cut into parts of equal rows and outputs are checked against them.
+# None to disable, e.g. Path(R"C:\Temp\MPF_Index")
+index_dir = None
+index_every = 10_000
+
+# "process" for parsing (GIL-bound), "thread" for copy-heavy I/O runs
+executor_type = "process"
+max_workers = os.cpu_count() or 4
+
+# memory a worker may spend on one chunk; rows per chunk are sized on the
+# measured width of the first chunk of each file. The optional pool budget
+# is shared equally by the max_workers workers, e.g. 24 GB on a 32 GB box.
+chunk_memory_budget_bytes = 256 * 1024**2
+pool_memory_budget_bytes = None
+
+# log files are written here, one per run; workers log through a queue
+log_dir = Path("logs")
+log_level = "INFO"
+
+# format of the reduced outputs: "csv", "parquet" or "arrow", or "rollup" to
+# only write group totals, merged into one rollup_*.csv per run
+output_format = "csv"
+
+# combine.py copies raw CSV bytes instead of parsing and rewriting them
+fast_combine = True
+
+# DEFLATE level of the combined zips; 6 is within about 1% of the size of 9
+# for a fraction of the CPU. zip.py compresses zip_workers files at once.
+zip_level = 6
+zip_workers = max_workers
+
+# combine.py streams the combined CSV straight into combined_*.zip, so the
+# uncompressed file is never written and zip.py has nothing left to do
+combine_to_zip = False
+
+# RPT files at least this large are parsed in parallel byte-range parts
+split_threshold_bytes = 4 * 1024**3
+split_parts = max_workers
+
+# compare.py compares every run of interest with this base run, joining the
+# reduced outputs per contract in this many partitions
+compare_base_run = "0"
+compare_partitions = 64
+
 run_numbers = ["179", "250"]
 runs_of_interest = [
     "0",
@@ -35,3 +107,8 @@ if is_omp:
     out_dir = Path(
         R"\\OMRPRTP05.za.omlac.net\DEVELOPMENT\PE_Results\Segments\MFC RSA\2024-12\Mass Risk\Ratul\OMP"  # noqa
     )
+
+# catalog of every reduced file, updated by main.py and queried by summary.py
+# and remove_error_files.py. Kept on local disk, as SQLite locking is not
+# reliable on network shares.
+catalog_file = Path("catalog_omp.sqlite" if is_omp else "catalog.sqlite")
@@ -1,11 +1,25 @@
 import pandas as pd
+import numpy as np
 import csv
+import io
+import itertools
+import pickle
+import queue
+import tempfile
+import threading
 from io import StringIO
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Tuple
+import locale
+import os
 import logging
+from src.chunking import ChunkSizer
 
-logger = logging.getLogger(__name__)
+# a child of the "mpf_reduction" logger, so it shares its (queue) handlers
+logger = logging.getLogger(f"mpf_reduction.{__name__}")
+
+# encoding used by open() in text mode, needed when decoding raw byte ranges
+encoding = locale.getpreferredencoding(False)
 
 
 def textfile_to_filtered_str_list(
@@ -34,14 +48,17 @@ def textfile_to_filtered_str_list(
     # keep track of whether or not the header row was processed
     found_header = False
 
+    header_marker = header_prefix + sep
+    entries_marker = entries_prefix + sep
+
     with open(file_path) as file:
         for _, line in enumerate(file):
             if not line:
                 pass  # do nothing if row is empty
-            elif (not found_header) and (line.split(sep)[0] == header_prefix):
+            elif (not found_header) and line.startswith(header_marker):
                 found_header = True
                 result.append(line)
-            elif found_header and (line.split(sep)[0] == entries_prefix):
+            elif found_header and line.startswith(entries_marker):
                 result.append(line)
 
     return result
@@ -68,6 +85,89 @@ def str_list_to_stringIO(str_list: List[str], newline="\r\n") -> StringIO:
     return str_io
 
 
+class FilteredRPTReader(io.TextIOBase):
+    """Read-only text stream over the header and entry lines of an RPT file.
+
+    Lines are filtered lazily as the consumer (e.g. pd.read_csv) pulls data,
+    so only a small buffer is held in memory regardless of the file size.
+    The underlying file is closed once it is exhausted.
+
+    Parameters
+    ----------
+    file_path : str | Path
+        Path object or string path
+    header_prefix : str, optional
+        Header marker, by default "!"
+    entries_prefix : str, optional
+        Entry marker, by default "*"
+    sep: str
+        Delimiter to use
+    """
+
+    def __init__(
+        self,
+        file_path: str | Path,
+        header_prefix="!",
+        entries_prefix="*",
+        sep=",",
+    ):
+        self._file = open(file_path)
+        self._header_marker = header_prefix + sep
+        self._entries_marker = entries_prefix + sep
+        self._found_header = False
+        self._buffer = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_line(self) -> str:
+        """Return the next kept line, or an empty string at the end."""
+        if self._file.closed:
+            return ""
+        for line in self._file:
+            if self._found_header:
+                if line.startswith(self._entries_marker):
+                    return line
+            elif line.startswith(self._header_marker):
+                self._found_header = True
+                return line
+        self._file.close()
+        return ""
+
+    def read(self, size: int | None = -1) -> str:
+        parts = [self._buffer]
+        if size is None or size < 0:
+            parts.extend(iter(self._next_line, ""))
+            self._buffer = ""
+            return "".join(parts)
+
+        length = len(self._buffer)
+        while length < size:
+            line = self._next_line()
+            if not line:
+                break
+            parts.append(line)
+            length += len(line)
+
+        data = "".join(parts)
+        self._buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size: int | None = -1) -> str:
+        if not self._buffer:
+            return self._next_line()
+        line, newline, rest = self._buffer.partition("\n")
+        if newline:
+            self._buffer = rest
+            return line + newline
+        self._buffer = ""
+        return line + self._next_line()
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
 def read_rpt(
     file_path: str | Path,
     header_prefix="!",
@@ -99,19 +199,15 @@ def read_rpt(
     pd.DataFrame | pd.io.parsers.TextFileReader
         Returns either a pandas DataFrame object or a TextFileReader for chunked reading
     """  # noqa
-    str_list = textfile_to_filtered_str_list(
-        file_path, header_prefix, entries_prefix, sep
-    )  # reads header (!) and entries (*) only
-
-    str_io = str_list_to_stringIO(
-        str_list
-    )  # converts list of strings to string_IO needed by pd.read_csv
+    # reads header (!) and entries (*) only, as pd.read_csv consumes it
+    rpt_stream = FilteredRPTReader(file_path, header_prefix, entries_prefix, sep)  # noqa
 
     if chunksize is None:
-        df = pd.read_csv(str_io, sep=sep, **csv_args).drop(header_prefix, axis=1)  # noqa
+        with rpt_stream:
+            df = pd.read_csv(rpt_stream, sep=sep, **csv_args).drop(header_prefix, axis=1)  # noqa
         return df
     else:
-        return pd.read_csv(str_io, sep=sep, chunksize=chunksize, **csv_args)
+        return pd.read_csv(rpt_stream, sep=sep, chunksize=chunksize, **csv_args)  # noqa
 
 
 def textfile_to_str_list(file_path):
@@ -132,6 +228,199 @@ def quote_all_strings(
     return quote + x + quote if isinstance(x, str) else x
 
 
+def quote_string_columns(df: pd.DataFrame, quote: str = '"') -> pd.DataFrame:
+    """Put quotes around the strings of a DataFrame, one column at a time.
+
+    Same result as applying quote_all_strings to every cell, but string
+    columns are quoted with vectorised string operations and numeric
+    columns are left untouched. Only columns mixing strings with other
+    values fall back to a per cell function.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame to quote
+    quote : str, optional
+        Quote character, by default '"'
+
+    Returns
+    -------
+    pd.DataFrame
+        A new DataFrame with quoted strings, missing values left missing
+    """
+    quoted = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            kind = pd.api.types.infer_dtype(values.cat.categories)
+            if kind == "string":
+                values = values.cat.rename_categories(
+                    quote + values.cat.categories + quote
+                )
+        elif pd.api.types.is_string_dtype(values.dtype):
+            kind = pd.api.types.infer_dtype(values, skipna=True)
+            if kind == "string":
+                values = quote + values + quote
+            elif kind in ("mixed", "mixed-integer"):
+                values = values.map(
+                    lambda x: quote_all_strings(x, quote), na_action="ignore"
+                )
+        quoted[col] = values
+    return pd.DataFrame(quoted, index=df.index)
+
+
+def _format_rpt_rows(df: pd.DataFrame) -> str:
+    """Quote a chunk and render it as RPT `*` rows, without a header."""
+    df = quote_string_columns(df)
+    df.insert(0, "!", "*")
+    return df.to_csv(index=False, header=False, quoting=csv.QUOTE_NONE)
+
+
+def _spill_sorted_run(chunk: pd.DataFrame, run_file: Path, block_rows: int):
+    """Write a sorted chunk to disk as a sequence of pickled blocks."""
+    with open(run_file, "wb") as file:
+        for start in range(0, len(chunk), block_rows):
+            pickle.dump(
+                chunk.iloc[start : start + block_rows],  # noqa: E203
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+
+def _iter_run_blocks(run_file: Path) -> Iterator[pd.DataFrame]:
+    with open(run_file, "rb") as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+
+def _merge_sorted_runs(
+    run_files: List[Path], sort_on: str
+) -> Iterator[pd.DataFrame]:
+    """Stable k-way merge of sorted runs, one block of each run in memory.
+
+    Every round outputs the rows of the current blocks that sort before the
+    smallest last key of those blocks: all rows still on disk sort at or
+    after it. Rows equal to that key are then taken one run at a time, in
+    run order, so ties keep the order of the input chunks.
+    """
+    runs = [_iter_run_blocks(run_file) for run_file in run_files]
+    blocks = [next(run, None) for run in runs]
+
+    while True:
+        live = [i for i, block in enumerate(blocks) if block is not None]
+        if not live:
+            return
+        boundary = min(blocks[i][sort_on].iloc[-1] for i in live)
+
+        ends = {
+            i: blocks[i][sort_on].searchsorted(boundary, side="left")
+            for i in live
+        }
+        if not any(ends.values()):
+            # every block starts at the boundary, take the ties of the
+            # first run that has them
+            i = next(i for i in live if blocks[i][sort_on].iloc[0] == boundary)  # noqa
+            ends = {i: blocks[i][sort_on].searchsorted(boundary, side="right")}
+
+        taken = []
+        for i, n in ends.items():
+            taken.append(blocks[i].iloc[:n])
+            block = blocks[i].iloc[n:]
+            if block.empty:
+                block = next(runs[i], None)
+            blocks[i] = block
+
+        merged = pd.concat(taken)
+        yield merged.sort_values(sort_on, kind="stable")
+
+
+def write_rpt(
+    chunks: Iterable[pd.DataFrame],
+    file_name: str | Path,
+    sort_on: str | None = "SPCODE",
+    block_rows: int = 50_000,
+    temp_dir: str | Path | None = None,
+) -> int:
+    """Write chunks of a DataFrame to an RPT file as they arrive.
+
+    Strings are quoted per column (see quote_string_columns) and every row
+    gets the `*` marker under a `!` header column. If `sort_on` is one of
+    the columns, each chunk is sorted and spilled to a temporary file, and
+    the sorted runs are merged into the output, so memory stays bounded by
+    the chunk size rather than the file size. Rows without a `sort_on`
+    value are written last, in input order.
+
+    Parameters
+    ----------
+    chunks : Iterable[pd.DataFrame]
+        Chunks with the same columns
+    file_name : str | Path
+        RPT file to write
+    sort_on : str | None, optional
+        Column to sort the rows by, by default "SPCODE". Ignored if None or
+        not a column.
+    block_rows : int, optional
+        Rows read back at a time per sorted run, by default 50000
+    temp_dir : str | Path | None, optional
+        Where the sorted runs are spilled, by default the system temp dir
+
+    Returns
+    -------
+    int
+        Number of rows written
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError("No chunks to write")
+
+    columns = list(first.columns)
+    sort = sort_on is not None and sort_on in columns
+    n_rows = 0
+
+    with open(file_name, "w", newline="") as out:
+        header = ",".join(["!"] + [str(col) for col in columns])
+        out.write(header + os.linesep)
+
+        if not sort:
+            for chunk in itertools.chain([first], chunks):
+                out.write(_format_rpt_rows(chunk[columns]))
+                n_rows += len(chunk)
+            return n_rows
+
+        with tempfile.TemporaryDirectory(dir=temp_dir) as spill_dir:
+            run_files = []
+            missing_files = []
+            for i, chunk in enumerate(itertools.chain([first], chunks)):
+                chunk = chunk[columns]
+                # missing keys can't be compared, they go after the merge
+                missing = chunk[sort_on].isna().to_numpy()
+                if missing.any():
+                    missing_file = Path(spill_dir) / f"missing{i:05d}.pkl"
+                    _spill_sorted_run(chunk[missing], missing_file, block_rows)
+                    missing_files.append(missing_file)
+                    chunk = chunk[~missing]
+
+                run_file = Path(spill_dir) / f"run{i:05d}.pkl"
+                chunk = chunk.sort_values(sort_on, kind="stable")
+                _spill_sorted_run(chunk, run_file, block_rows)
+                run_files.append(run_file)
+            logger.debug(f"Merging {len(run_files)} sorted runs")
+
+            blocks = itertools.chain(
+                _merge_sorted_runs(run_files, sort_on),
+                *(_iter_run_blocks(file) for file in missing_files),
+            )
+            for block in blocks:
+                out.write(_format_rpt_rows(block))
+                n_rows += len(block)
+
+    return n_rows
+
+
 # The following extension allows us to do -> df.rpt.to_rpt("file_name.rpt")
 # without needing to subclass pd.DataFrame
 @pd.api.extensions.register_dataframe_accessor("rpt")
@@ -140,21 +429,22 @@ class PredictableAccessor:
         self._obj = pandas_obj
 
     def to_rpt(self, file_name: str | None = None, sort_on="SPCODE"):
-        # Wrap all strings in quotes
-        df = self._obj.applymap(quote_all_strings)
-
-        # Add ! heading with all * entries
-        df.insert(0, "!", "*")
+        # write to file if file_name is provided
+        if file_name:
+            write_rpt([self._obj], file_name, sort_on)
+            return None
 
+        df = self._obj
         # Sort if required
         if sort_on in list(df.columns):
-            df = df.sort_values(sort_on)
+            df = df.sort_values(sort_on, kind="stable")
 
-        # write to file if file_name is provided
-        if file_name:
-            return df.to_csv(file_name, index=False, quoting=csv.QUOTE_NONE)
-        else:
-            return df
+        # Wrap all strings in quotes
+        df = quote_string_columns(df)
+
+        # Add ! heading with all * entries
+        df.insert(0, "!", "*")
+        return df
 
 
 def write_chunked_csv(
@@ -193,15 +483,320 @@ def write_chunked_csv(
     )
 
 
-def stream_rpt_file(file_path: str | Path, chunk_size: int = 10_000):
+def rows_to_frame(
+    rows: List[List[str]],
+    columns: List[str],
+    dtypes: Dict[str, str] | None = None,
+) -> pd.DataFrame:
+    """Build a DataFrame from parsed string rows, applying a column schema.
+
+    Parameters
+    ----------
+    rows : List[List[str]]
+        Parsed rows, each holding one string per column
+    columns : List[str]
+        Column names
+    dtypes : Dict[str, str] | None, optional
+        Mapping of column name to dtype. Numeric columns are converted
+        straight into typed arrays; columns mapped to "str" or missing from
+        the mapping are kept as strings. If None, all columns are strings.
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame for the rows
+    """
+    if not dtypes:
+        return pd.DataFrame(rows, columns=columns)
+
+    data = {}
+    values_by_col = zip(*rows) if rows else [()] * len(columns)
+    for col, values in zip(columns, values_by_col):
+        dtype = dtypes.get(col, "str")
+        if dtype in ("str", "object"):
+            data[col] = np.array(values, dtype=object)
+            continue
+        try:
+            data[col] = np.array(values, dtype=dtype)
+        except ValueError:
+            # blanks or malformed numbers, fall back to NaN for those cells
+            logger.warning(f"Column {col} has non-numeric values, coercing to NaN")  # noqa
+            data[col] = pd.to_numeric(
+                pd.Series(values, dtype=object), errors="coerce"
+            ).to_numpy()
+    return pd.DataFrame(data, columns=columns)
+
+
+def parse_rpt_header(line: str) -> List[str] | None:
+    """Parse a header line of an RPT file.
+
+    Parameters
+    ----------
+    line : str
+        A line from the RPT file
+
+    Returns
+    -------
+    List[str] | None
+        Column names (with quotes removed), or None if the line is not a header
+    """
+    parts = line.strip().split(",")
+    if parts[0] != "!":
+        return None
+    return [col.strip('"') for col in parts[1:]]
+
+
+def read_rpt_header(file_path: str | Path) -> Tuple[List[str], int]:
+    """Read the header of an RPT file without parsing the data section.
+
+    Parameters
+    ----------
+    file_path : str | Path
+        Path to the RPT file
+
+    Returns
+    -------
+    Tuple[List[str], int]
+        Column names and the byte offset of the first line after the header
+    """
+    with open(file_path, "rb") as file:
+        for raw in iter(file.readline, b""):
+            header = parse_rpt_header(raw.decode(encoding))
+            if header is not None:
+                return header, file.tell()
+    raise ValueError(f"No header row found in {file_path}")
+
+
+def split_rpt_ranges(
+    file_path: str | Path, n_parts: int, data_start: int
+) -> List[Tuple[int, int]]:
+    """Split the data section of an RPT file into byte ranges.
+
+    Each boundary is moved forward to the start of the next line, so every
+    range holds whole lines only.
+
+    Parameters
+    ----------
+    file_path : str | Path
+        Path to the RPT file
+    n_parts : int
+        Number of ranges to aim for
+    data_start : int
+        Byte offset of the first data line, see `read_rpt_header`
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        Ordered, non-empty (start, end) byte ranges covering the data section
+    """
+    file_size = Path(file_path).stat().st_size
+    part_size = max((file_size - data_start) // max(n_parts, 1), 1)
+
+    boundaries = [data_start]
+    with open(file_path, "rb") as file:
+        for i in range(1, n_parts):
+            file.seek(data_start + i * part_size)
+            file.readline()  # move to the start of the next line
+            boundary = min(file.tell(), file_size)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if file_size > boundaries[-1]:
+        boundaries.append(file_size)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def resolve_usecols(
+    header: List[str], usecols: List[str] | None
+) -> Tuple[List[str], List[int] | None]:
+    """Resolve projected column names to positions in a data row.
+
+    Parameters
+    ----------
+    header : List[str]
+        Column names from the header row
+    usecols : List[str] | None
+        Columns to keep, or None to keep all columns
+
+    Returns
+    -------
+    Tuple[List[str], List[int] | None]
+        Kept column names (in header order) and their positions in a split
+        data row (including the "*" marker), or None if all columns are kept
+    """
+    if usecols is None:
+        return header, None
+
+    wanted = set(usecols)
+    col_idx = [i for i, col in enumerate(header) if col in wanted]
+    columns = [header[i] for i in col_idx]
+    missing = wanted.difference(columns)
+    if missing:
+        logger.warning(f"Columns not found in header: {sorted(missing)}")
+
+    # offset by one to skip the "*" marker
+    return columns, [i + 1 for i in col_idx]
+
+
+class ReadaheadReader(io.RawIOBase):
+    """Binary file reader that keeps reading ahead in a background thread.
+
+    Large sequential reads are queued up to `readahead_mb` ahead of the
+    consumer, so a slow network share keeps streaming while the parser is
+    busy, without first copying the whole file to local disk.
+
+    Parameters
+    ----------
+    file_path : str | Path
+        Path to the file
+    start : int, optional
+        Byte offset to start reading at, by default 0
+    end : int | None, optional
+        Byte offset to stop reading at, e.g. the end of a byte range, so
+        nothing past it is fetched. By default the end of the file.
+    readahead_mb : int, optional
+        Maximum number of MB read ahead, by default 64
+    block_size : int, optional
+        Size of each read in bytes, by default 8 MB
+    """
+
+    def __init__(
+        self,
+        file_path: str | Path,
+        start: int = 0,
+        end: int | None = None,
+        readahead_mb: int = 64,
+        block_size: int = 8 * 1024**2,
+    ):
+        self._file = open(file_path, "rb", buffering=0)
+        self._file.seek(start)
+        self._remaining = None if end is None else max(end - start, 0)
+        self._blocks = queue.Queue(
+            maxsize=max(1, readahead_mb * 1024**2 // block_size)
+        )
+        self._block_size = block_size
+        self._current = memoryview(b"")
+        self._stop = threading.Event()
+        self._eof = False
+        self._thread = threading.Thread(
+            target=self._read_ahead, name="readahead", daemon=True
+        )
+        self._thread.start()
+
+    def _read_ahead(self):
+        try:
+            while not self._stop.is_set():
+                size = self._block_size
+                if self._remaining is not None:
+                    size = min(size, self._remaining)
+                block = self._file.read(size) if size else b""
+                if self._remaining is not None:
+                    self._remaining -= len(block)
+                self._put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        # wait for room, but give up once the reader is closed
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._current and not self._eof:
+            block = self._blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                self._eof = True
+            self._current = memoryview(block)
+        n = min(len(buffer), len(self._current))
+        buffer[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._file.close()
+        super().close()
+
+
+def _iter_lines(
+    file_path: str | Path,
+    byte_range: Tuple[int, int] | None,
+    readahead_mb: int | None = None,
+):
+    """Yield the lines of a file, optionally limited to a byte range."""
+    start, end = byte_range if byte_range is not None else (0, None)
+
+    if readahead_mb:
+        raw = ReadaheadReader(file_path, start, end, readahead_mb)
+        file = io.BufferedReader(raw, buffer_size=1024**2)
+    else:
+        file = open(file_path, "rb")
+        file.seek(start)
+
+    with file:
+        if end is None:
+            # the whole file, decoded like open() in text mode
+            yield from io.TextIOWrapper(file, encoding=encoding)
+            return
+
+        pos = start
+        while pos < end:
+            raw_line = file.readline()
+            if not raw_line:
+                break
+            pos += len(raw_line)
+            yield raw_line.decode(encoding)
+
+
+def stream_rpt_file(
+    file_path: str | Path,
+    chunk_size: int | ChunkSizer = 10_000,
+    usecols: List[str] | None = None,
+    dtypes: Dict[str, str] | None = None,
+    byte_range: Tuple[int, int] | None = None,
+    stats: Dict[str, int] | None = None,
+    readahead_mb: int | None = None,
+):
     """Stream process an RPT file line by line and yield chunks of data.
 
     Parameters
     ----------
     file_path : str | Path
         Path to the RPT file
-    chunk_size : int, optional
-        Number of lines to process in each chunk, by default 10000
+    chunk_size : int | ChunkSizer, optional
+        Number of lines to process in each chunk, by default 10000. With a
+        ChunkSizer, the first chunk is a small probe and the following
+        chunks are sized on its memory use.
+    usecols : List[str] | None, optional
+        Only materialise these columns. Column positions are resolved once
+        from the header and columns missing from the header are ignored.
+        If None, all columns are kept.
+    dtypes : Dict[str, str] | None, optional
+        Column schema passed to `rows_to_frame`, by default None (all strings)
+    byte_range : Tuple[int, int] | None, optional
+        Only parse the data lines in this (start, end) byte range, as returned
+        by `split_rpt_ranges`. The header is read separately. If None, the
+        whole file is parsed.
+    stats : Dict[str, int] | None, optional
+        If given, the number of malformed rows that were skipped is added to
+        its "rejected_rows" entry.
+    readahead_mb : int | None, optional
+        If given, read the file through a ReadaheadReader that keeps this
+        many MB ahead of the parser, e.g. when reading straight from a
+        network share. By default the file is read with plain buffered I/O.
 
     Yields
     ------
@@ -209,66 +804,87 @@ def stream_rpt_file(file_path: str | Path, chunk_size: int = 10_000):
         Chunks of data as pandas DataFrames
     """
     header = None
+    columns = None
+    col_idx = None
     chunk = []
     count = 0
     total_rows = 0
+    sizer = chunk_size if isinstance(chunk_size, ChunkSizer) else None
+    limit = sizer.rows if sizer is not None else chunk_size
 
     try:
-        with open(file_path, "r") as file:
-            for line_num, line in enumerate(file, 1):
-                if not line.strip():
+        if byte_range is not None:
+            header, _ = read_rpt_header(file_path)
+            columns, col_idx = resolve_usecols(header, usecols)
+
+        for line_num, line in enumerate(
+            _iter_lines(file_path, byte_range, readahead_mb), 1
+        ):
+            if not line.strip():
+                continue
+
+            try:
+                parts = line.strip().split(",")
+
+                # Process header
+                if parts[0] == "!":
+                    # Remove any quotes from header
+                    header = parse_rpt_header(line)
+                    logger.info(f"Found header with {len(header)} columns")
+                    logger.debug(f"Header columns: {header}")
+
+                    # Resolve the positions of the projected columns once
+                    columns, col_idx = resolve_usecols(header, usecols)
                     continue
 
-                try:
-                    parts = line.strip().split(",")
-
-                    # Process header
-                    if parts[0] == "!":
-                        # Remove any quotes from header
-                        header = [col.strip('"') for col in parts[1:]]
-                        msg = f"Found header with {len(header)} columns: {header}"  # noqa
-                        logger.info(msg)
+                # Process data rows
+                if parts[0] == "*":
+                    if len(parts[1:]) != len(header):
+                        msg = (
+                            f"Line {line_num}: Row has {len(parts[1:])} "
+                            f"columns but header has {len(header)} columns"
+                        )
+                        logger.warning(msg)
+                        if stats is not None:
+                            stats["rejected_rows"] += 1
                         continue
 
-                    # Process data rows
-                    if parts[0] == "*":
-                        if len(parts[1:]) != len(header):
-                            msg = (
-                                f"Line {line_num}: Row has {len(parts[1:])} "
-                                f"columns but header has {len(header)} columns"
-                            )
-                            logger.warning(msg)
-                            continue
-
-                        # Clean up the data values
+                    # Clean up the data values
+                    if col_idx is None:
                         cleaned_parts = [val.strip('"') for val in parts[1:]]
-                        chunk.append(cleaned_parts)
-                        count += 1
-                        total_rows += 1
-
-                        # Yield chunk when it reaches the desired size
-                        if count >= chunk_size:
-                            df = pd.DataFrame(chunk, columns=header)
-                            msg = (
-                                f"Yielding chunk of {len(df)} rows "
-                                f"(total processed: {total_rows})"
-                            )
-                            logger.info(msg)
-                            yield df
-                            chunk = []
-                            count = 0
-                except Exception as e:
-                    logger.error(f"Error processing line {line_num}: {str(e)}")
-                    continue
+                    else:
+                        cleaned_parts = [parts[i].strip('"') for i in col_idx]
+                    chunk.append(cleaned_parts)
+                    count += 1
+                    total_rows += 1
+
+                    # Yield chunk when it reaches the desired size
+                    if count >= limit:
+                        df = rows_to_frame(chunk, columns, dtypes)
+                        if sizer is not None and not sizer.measured:
+                            limit = sizer.observe(df)
+                        msg = (
+                            f"Yielding chunk of {len(df)} rows "
+                            f"(total processed: {total_rows})"
+                        )
+                        logger.debug(msg)
+                        yield df
+                        chunk = []
+                        count = 0
+            except Exception as e:
+                logger.error(f"Error processing line {line_num}: {str(e)}")
+                if stats is not None:
+                    stats["rejected_rows"] += 1
+                continue
 
         # Yield any remaining data
         if chunk:
-            df = pd.DataFrame(chunk, columns=header)
+            df = rows_to_frame(chunk, columns, dtypes)
             msg = (
                 f"Yielding final chunk of {len(df)} rows "
                 f"(total processed: {total_rows})"
             )
-            logger.info(msg)
+            logger.debug(msg)
             yield df
 
     except Exception as e:
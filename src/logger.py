@@ -4,29 +4,20 @@ from pathlib import Path
 import sys
 from datetime import datetime
 
+# Modules log through this logger; it has no handlers until one of the setup
+# functions below is called by an entry point.
+logger = logging.getLogger("mpf_reduction")
 
-def setup_logger(name: str = "mpf_reduction") -> logging.Logger:
-    """
-    Set up and configure the logger for the application.
-
-    Args:
-        name (str): Name of the logger
 
-    Returns:
-        logging.Logger: Configured logger instance
-    """
+def _make_handlers(log_dir: Path, level: int) -> list[logging.Handler]:
+    """Create the file and console handlers used by both setups."""
     # Create logs directory if it doesn't exist
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
+    log_dir.mkdir(parents=True, exist_ok=True)
 
     # Create timestamp for unique log file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file = log_dir / f"mpf_reduction_{timestamp}.log"
 
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-
     # Create formatters
     file_formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -35,20 +26,119 @@ def setup_logger(name: str = "mpf_reduction") -> logging.Logger:
 
     # File handler (without rotation since we want a new file each run)
     file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(level)
     file_handler.setFormatter(file_formatter)
 
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(level)
     console_handler.setFormatter(console_formatter)
 
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    return [file_handler, console_handler]
+
+
+def _set_handlers(name: str, level: int, handlers: list[logging.Handler]):
+    """Replace the handlers of a logger, so repeated setup never duplicates."""
+    named_logger = logging.getLogger(name)
+    for handler in list(named_logger.handlers):
+        named_logger.removeHandler(handler)
+        handler.close()
+    named_logger.setLevel(level)
+    named_logger.propagate = False
+    for handler in handlers:
+        named_logger.addHandler(handler)
+    return named_logger
+
+
+def setup_logger(
+    name: str = "mpf_reduction",
+    log_dir: Path = Path("logs"),
+    level: int | str = logging.INFO,
+) -> logging.Logger:
+    """
+    Set up the logger with synchronous file and stdout handlers.
+
+    Suitable for single-process scripts; use start_queue_logging when
+    logging from a pool of workers.
+
+    Args:
+        name (str): Name of the logger
+        log_dir (Path): Folder for the log file
+        level (int | str): Logging level
+
+    Returns:
+        logging.Logger: Configured logger instance
+    """
+    level = logging.getLevelName(level) if isinstance(level, str) else level
+    return _set_handlers(name, level, _make_handlers(log_dir, level))
+
+
+def start_queue_logging(
+    queue,
+    name: str = "mpf_reduction",
+    log_dir: Path = Path("logs"),
+    level: int | str = logging.INFO,
+    batch_size: int = 256,
+) -> logging.handlers.QueueListener:
+    """
+    Set up non-blocking logging through a queue.
+
+    Records are only put on the queue by the logging call; a listener thread
+    in this process writes them out. File output is buffered and flushed in
+    batches of `batch_size` records, or straight away for warnings and above.
+    Worker processes attach to the same queue with configure_worker.
+
+    Args:
+        queue: A queue.Queue for threads or a multiprocessing queue for
+            worker processes
+        name (str): Name of the logger
+        log_dir (Path): Folder for the log file
+        level (int | str): Logging level
+        batch_size (int): Number of records buffered before writing the file
+
+    Returns:
+        logging.handlers.QueueListener: The started listener, stop it with
+            stop_queue_logging
+    """
+    level = logging.getLevelName(level) if isinstance(level, str) else level
+    file_handler, console_handler = _make_handlers(log_dir, level)
+    batched_file_handler = logging.handlers.MemoryHandler(
+        batch_size, flushLevel=logging.WARNING, target=file_handler
+    )
 
-    return logger
+    listener = logging.handlers.QueueListener(
+        queue,
+        batched_file_handler,
+        console_handler,
+        respect_handler_level=True,
+    )
+    listener.start()
+
+    configure_worker(queue, name, level)
+    return listener
+
+
+def configure_worker(queue, name: str = "mpf_reduction", level: int | str = logging.INFO):  # noqa
+    """
+    Send the records of this process to the logging queue.
+
+    Used as the initializer of worker processes, see start_queue_logging.
+
+    Args:
+        queue: The queue passed to start_queue_logging
+        name (str): Name of the logger
+        level (int | str): Logging level
+    """
+    level = logging.getLevelName(level) if isinstance(level, str) else level
+    _set_handlers(name, level, [logging.handlers.QueueHandler(queue)])
 
 
-# Create default logger instance
-logger = setup_logger()
+def stop_queue_logging(listener: logging.handlers.QueueListener):
+    """Write out all queued records and close the handlers."""
+    listener.stop()
+    for handler in listener.handlers:
+        handler.flush()
+        handler.close()
+        target = getattr(handler, "target", None)
+        if target is not None:
+            target.close()
@@ -0,0 +1,109 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+class FileMetrics:
+    """Time, bytes and rows spent per stage (copy, parse, transform, write,
+    hash) while handling one file.
+
+    Instances stay in the worker; `to_dict` gives a plain, picklable summary
+    that is returned to main.py and aggregated there.
+
+    Args:
+        name (str): Name of the file, used to group the stages of one file
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages = {}
+
+    def add(self, stage: str, seconds: float = 0.0, bytes: int = 0, rows: int = 0):  # noqa
+        totals = self.stages.setdefault(
+            stage, {"seconds": 0.0, "bytes": 0, "rows": 0}
+        )
+        totals["seconds"] += seconds
+        totals["bytes"] += bytes
+        totals["rows"] += rows
+
+    @contextmanager
+    def time(self, stage: str, bytes: int = 0, rows: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, bytes, rows)
+
+    def timed_iter(self, stage: str, iterable: Iterable) -> Iterator:
+        """Yield from an iterable, timing how long each item takes to produce.
+
+        Items with a length (e.g. DataFrame chunks) are counted as rows.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start)
+                return
+            rows = len(item) if hasattr(item, "__len__") else 0
+            self.add(stage, time.perf_counter() - start, rows=rows)
+            yield item
+
+    def to_dict(self, **extra) -> dict:
+        return {"file": self.name, **extra, "stages": self.stages}
+
+
+def aggregate(all_metrics: list[dict]) -> dict:
+    """Total the stages of many files, with throughput per stage.
+
+    Args:
+        all_metrics (list[dict]): Results of FileMetrics.to_dict
+
+    Returns:
+        dict: stage -> seconds, bytes, rows, mb_per_sec and rows_per_sec.
+            Seconds are summed over workers, so throughput is per worker.
+    """
+    combined = FileMetrics("total")
+    for metrics in all_metrics:
+        for stage, totals in metrics["stages"].items():
+            combined.add(stage, **totals)
+
+    for totals in combined.stages.values():
+        seconds = totals["seconds"]
+        totals["mb_per_sec"] = totals["bytes"] / 1024**2 / seconds if seconds else 0.0  # noqa
+        totals["rows_per_sec"] = totals["rows"] / seconds if seconds else 0.0
+    return combined.stages
+
+
+def write_report(
+    report_file: Path,
+    all_metrics: list[dict],
+    wall_seconds: float,
+    **run_info,
+) -> Path:
+    """Write the machine-readable metrics report of a run.
+
+    Args:
+        report_file (Path): JSON file to write
+        all_metrics (list[dict]): Results of FileMetrics.to_dict
+        wall_seconds (float): Elapsed time of the whole run
+        **run_info: Extra run level fields, e.g. the number of workers
+
+    Returns:
+        Path: The report file
+    """
+    report = {
+        "finished": datetime.now().isoformat(timespec="seconds"),
+        "wall_seconds": wall_seconds,
+        **run_info,
+        "totals": aggregate(all_metrics),
+        "files": all_metrics,
+    }
+    with open(report_file, "w") as file:
+        json.dump(report, file, indent=2, default=str)
+    return report_file
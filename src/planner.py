@@ -0,0 +1,165 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from src.logger import logger
+from src.columns import cols_to_keep
+from src.config import (
+    input_dir,
+    local_temp_dir,
+    out_dir,
+    run_numbers,
+    runs_of_interest,
+    is_omp,
+    hash_sources,
+    discovery_workers,
+    expected_mb_per_sec,
+)
+from src.catalog import Catalog
+from src.sidecar import is_complete
+from src.process import get_out_file, get_config_key
+
+
+def get_results_dir(run: str, run_number: str) -> Path:
+    """Folder holding the RPT files of a run and run number."""
+    if is_omp:
+        run_type = "NB" if run_number == "250" else "CLS"
+        return input_dir / f"#288.{run}" / run_type / run_number / f"RUN_{run_number}"  # noqa
+    return input_dir / f"#288.{run}" / f"RUN_{run_number}"
+
+
+def list_rpt_files(results_dir: Path) -> list[tuple[Path, int]]:
+    """List the RPT files in a folder with their sizes.
+
+    os.scandir returns the sizes with the listing on Windows shares, so no
+    extra round trip per file is needed.
+
+    Args:
+        results_dir (Path): Folder to list
+
+    Returns:
+        list[tuple[Path, int]]: RPT files and their sizes in bytes
+    """
+    try:
+        with os.scandir(results_dir) as entries:
+            return [
+                (Path(entry.path), entry.stat().st_size)
+                for entry in entries
+                if entry.is_file() and entry.name.lower().endswith(".rpt")
+            ]
+    except FileNotFoundError:
+        return []
+
+
+def _discover(
+    run: str, run_number: str, config_key: str
+) -> tuple[list[tuple], list[tuple[Path, Path]]]:
+    """Find the RPT files of one run that still need to be reduced, and the
+    (output, RPT file) pairs that are up to date."""
+    results_dir = get_results_dir(run, run_number)
+    rpts = list_rpt_files(results_dir)
+    logger.info(f"Folder: {results_dir} - Found {len(rpts)} RPT files")
+
+    found = []
+    skipped = []
+    for rpt_file, size in rpts:
+        out_file = get_out_file(out_dir, run, run_number, rpt_file)
+
+        if is_complete(out_file, rpt_file, config_key, hash_sources):
+            logger.info(
+                f"skipping #288.{run} RUN_{run_number} {rpt_file.name}"  # noqa
+            )
+            skipped.append((out_file, rpt_file))
+            continue
+
+        task = (rpt_file, run, run_number, out_dir, local_temp_dir, cols_to_keep)  # noqa
+        found.append((task, size))
+    return found, skipped
+
+
+def build_tasks(catalog: Catalog | None = None) -> list[tuple[tuple, int]]:
+    """Find all RPT files that still need to be reduced.
+
+    The run folders are listed concurrently. An RPT is skipped only if its
+    output has a manifest that matches the current fingerprint of the RPT
+    (size, mtime and optionally a content hash) and the current
+    configuration, so interrupted or stale outputs are redone. The combined
+    files of any run that gets new outputs are removed, as they are out of
+    date.
+
+    Tasks are ordered largest file first, so the biggest files do not start
+    last and run alone at the end.
+
+    Args:
+        catalog (Catalog | None): If given, up to date outputs it doesn't
+            have as complete are recorded in it, so reports include them
+
+    Returns:
+        list[tuple[tuple, int]]: Argument tuples for process_rpt_file with
+            the size of each RPT file in bytes
+    """
+    config_key = get_config_key(cols_to_keep)
+    runs = [(run, run_number) for run in runs_of_interest for run_number in run_numbers]  # noqa
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=discovery_workers) as executor:
+        found = list(
+            executor.map(lambda args: _discover(*args, config_key), runs)
+        )
+        all_tasks = [task for tasks, _ in found for task in tasks]
+    end = time.perf_counter()
+    logger.info(f"Discovered {len(all_tasks)} RPT files in {end - start:.2f}s")
+
+    all_tasks.sort(key=lambda task: task[1], reverse=True)
+
+    if catalog is not None:
+        complete = {entry["output"] for entry in catalog.files("complete")}
+        for _, skipped in found:
+            for out_file, rpt_file in skipped:
+                if str(out_file) not in complete:
+                    catalog.record_output(out_file, rpt_file, {})
+
+    for run, run_number in sorted({(task[1], task[2]) for task, _ in all_tasks}):  # noqa
+        invalidate_combined(run, run_number)
+
+    return all_tasks
+
+
+def log_plan(all_tasks: list[tuple[tuple, int]], workers: int):
+    """Report the number of files, total size and a rough time estimate.
+
+    Args:
+        all_tasks (list[tuple[tuple, int]]): The tasks from build_tasks
+        workers (int): Number of parser workers
+    """
+    total_bytes = sum(size for _, size in all_tasks)
+    largest = all_tasks[0][1] if all_tasks else 0
+
+    # the run can't finish before the largest file (unless it is split)
+    throughput = expected_mb_per_sec * 1024**2
+    estimate = max(total_bytes / (throughput * workers), largest / throughput)
+
+    logger.info(
+        f"Plan: {len(all_tasks)} files, {total_bytes / 1024**3:.1f} GB, "
+        f"largest {largest / 1024**3:.1f} GB, "
+        f"estimated {estimate / 60:.0f} min with {workers} workers"
+    )
+
+
+def invalidate_combined(run: str, run_number: str):
+    """Remove the combine/zip outputs of a run that is being reprocessed.
+
+    Args:
+        run (str): Run, e.g. "408" for #288.408
+        run_number (str): Run number, e.g. "179"
+    """
+    name = f"#288.{run}_RUN_{run_number}"
+    for file in [
+        out_dir / f"combined_{name}.csv",
+        out_dir / f"summary_{name}.csv",
+        out_dir / f"combined_{name}.zip",
+        out_dir / f"rollup_{name}.csv",
+    ]:
+        if file.exists():
+            logger.info(f"Removing out of date {file}")
+            file.unlink()
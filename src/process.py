@@ -1,103 +1,441 @@
+import os
 import time
 import shutil
-from src.io import write_chunked_csv, stream_rpt_file
-from src.config import use_local_copy, is_omp
+from pathlib import Path
+from src.io import (
+    stream_rpt_file,
+    read_rpt_header,
+    split_rpt_ranges,
+)
+from src.sinks import (
+    ChecksumFile,
+    RollupSink,
+    get_sink,
+    merge_rollups,
+    read_output_chunks,
+    read_output_columns,
+)
+from src.config import (
+    use_local_copy,
+    is_omp,
+    output_format,
+    hash_sources,
+    readahead_mb,
+    max_workers,
+    chunk_memory_budget_bytes,
+    pool_memory_budget_bytes,
+    cache_dir,
+    cache_max_bytes,
+    index_dir,
+)
+from src.cache import RptCache
+from src.staging import staged_path
+from src.chunking import ChunkSizer, worker_budget_bytes
 from src.logger import logger
+from src.columns import (
+    cols_to_keep as default_cols_to_keep,
+    column_dtypes,
+    summary_cols,
+    chunk_transforms,
+    rollup_keys,
+    rollup_measures,
+)
+from src.transforms import ChunkTransform, source_columns
+from src.metrics import FileMetrics
+from src.rpt_index import load_index
+from src.sidecar import (
+    new_stats,
+    update_stats,
+    merge_stats,
+    read_sidecar,
+    write_sidecar,
+    temp_path,
+    commit_output,
+    is_complete,
+    config_fingerprint,
+    file_sha256,
+)
 
+Sink = get_sink(output_format)
+# rows dropped by a filter transform are not in the output
+filtered = any(step["op"] == "filter" for step in chunk_transforms)
+rpt_cache = RptCache(cache_dir, cache_max_bytes) if cache_dir is not None else None  # noqa
 
-def process_rpt_file(args):
+
+def get_out_file(out_dir: Path, run: str, run_number: str, rpt_file: Path) -> Path:  # noqa
+    """Path of the reduced output for an RPT file."""
+    out_path = out_dir / f"#288.{run}" / f"RUN_{run_number}"
+    return out_path / f"{rpt_file.stem}{Sink.suffix}"
+
+
+def get_config_key(cols_to_keep: list[str]) -> str:
+    """Fingerprint of everything that shapes an output, see
+    config_fingerprint."""
+    rollup = None
+    if Sink is RollupSink:
+        rollup = {"keys": rollup_keys, "measures": rollup_measures}
+    return config_fingerprint(
+        cols_to_keep, is_omp, chunk_transforms, summary_cols, rollup
+    )
+
+
+def get_usecols(cols_to_keep: list[str]) -> list[str]:
+    """Columns that need to be parsed from the RPT file."""
+    usecols = list(cols_to_keep)
+    for col in source_columns(chunk_transforms):
+        if col not in usecols:
+            usecols.append(col)
+    return usecols
+
+
+def new_chunk_sizer() -> ChunkSizer:
+    """Chunk sizing for one file, within the memory budget of a worker."""
+    return ChunkSizer(
+        worker_budget_bytes(
+            chunk_memory_budget_bytes, pool_memory_budget_bytes, max_workers
+        )
+    )
+
+
+def get_transform(columns) -> ChunkTransform:
+    """The chunk transforms of src/columns.py, checked against a header."""
+    return ChunkTransform(chunk_transforms, columns)
+
+
+def get_output_columns(columns, cols_to_keep: list[str]) -> list[str]:
+    """Columns written to the reduced output, in order."""
+    transform = get_transform(columns)
+    # Get intersection of available columns and cols_to_keep
+    output_columns = [transform.renamed[col] for col in cols_to_keep if col in columns]  # noqa
+
+    # derived columns (product code, contract ID parts) first
+    return transform.added_columns + output_columns
+
+
+def process_rpt_file(args, local_copy: Path | None = None) -> dict:
     rpt_file, run, run_number, out_dir, local_temp_dir, cols_to_keep = args
-    local_copy = local_temp_dir / rpt_file.name
+    # a copy staged by the Stager, or one made here with use_local_copy
+    staged = local_copy is not None
+    if not staged:
+        local_copy = staged_path(local_temp_dir, rpt_file)
+    metrics = FileMetrics(str(rpt_file))
     try:
-        out_path = out_dir / f"#288.{run}" / f"RUN_{run_number}"
-        out_file = out_path / f"{rpt_file.stem}.csv"
+        out_file = get_out_file(out_dir, run, run_number, rpt_file)
+        out_path = out_file.parent
 
-        if out_file.exists():
+        config_key = get_config_key(cols_to_keep)
+        if is_complete(out_file, rpt_file, config_key, hash_sources):
             logger.info(f"{rpt_file} already exists. skipping...")
-            return
+            return metrics.to_dict(output=str(out_file), skipped=True)
 
         out_path.mkdir(parents=True, exist_ok=True)
 
-        if use_local_copy:
+        if staged:
+            pass  # already copied by the Stager
+        elif use_local_copy and rpt_cache is not None:
+            # usually already staged into the cache, or kept from a
+            # previous run
+            fetch_start = time.perf_counter()
+            local_copy, hit = rpt_cache.fetch(rpt_file)
+            if not hit:
+                seconds = time.perf_counter() - fetch_start
+                metrics.add("copy", seconds, bytes=local_copy.stat().st_size)
+        elif use_local_copy:
             # check if the file has already been copied
             if not local_copy.exists():
                 logger.info(f"Copying {rpt_file} to {local_copy}")
-                shutil.copy2(rpt_file, local_copy)
+                with metrics.time("copy", bytes=rpt_file.stat().st_size):
+                    shutil.copy2(rpt_file, local_copy)
 
         start = time.perf_counter()
-        if use_local_copy:
-            logger.info(f"Reading {local_copy}")
-        else:
-            logger.info(f"Reading {rpt_file}")
-
-        # Process file in chunks using streaming
-        chunk_size = 10_000
-        output_columns = None
-        is_first_chunk = True  # Renamed for clarity
-
-        for chunk in stream_rpt_file(
-            local_copy if use_local_copy else rpt_file, chunk_size=chunk_size
-        ):
-            msg = f"Processing chunk of {rpt_file.name} with {len(chunk)} rows"
-            logger.info(msg)
-
-            # chunk level manipulations
-            if not is_omp:
-                # split IFRS17_CONTRACT_ID into 3 columns
-                # 69410S705341618_1_477 -> 69410S705341618, 1, 477
-                split_contract = chunk["IFRS17_CONTRACT_ID"].str.split("_", expand=True)  # noqa
-                chunk["POLICY_NUMBER"] = split_contract[0]
-                chunk["SEQUENCE_NUMBER"] = split_contract[1]
-                chunk["PLAN_CODE"] = split_contract[2]
-
-                # Log any rows with missing or malformed contract IDs
-                invalid_mask = chunk["IFRS17_CONTRACT_ID"].isna() | (
-                    split_contract[2].isna()
-                )
-                invalid_contracts = chunk[invalid_mask]
-                if not invalid_contracts.empty:
-                    logger.warning(
-                        f"Found {len(invalid_contracts)} rows with invalid contract IDs"  # noqa
-                    )
-
-            # add a col for product code
-            chunk["PRODUCT_CODE"] = rpt_file.stem
-
-            logger.info("Chunk manipulation complete")
-
-            if is_first_chunk:
-                # Get intersection of available columns and cols_to_keep
-                output_columns = [col for col in cols_to_keep if col in chunk.columns]  # noqa
-                if not is_omp:
-                    output_columns = [
-                        "POLICY_NUMBER",
-                        "SEQUENCE_NUMBER",
-                        "PLAN_CODE",
-                    ] + output_columns
-
-                # add product code
-                output_columns = ["PRODUCT_CODE"] + output_columns
-
-                logger.info(f"Selected {len(output_columns)} columns")
-                logger.info(f"Columns: {output_columns}")
-
-            # Write chunk to file
-            write_chunked_csv(
-                chunk,
-                output_columns,
-                out_file,
-                mode="w" if is_first_chunk else "a",
-                header=is_first_chunk,
+        source = local_copy if use_local_copy or staged else rpt_file
+        logger.info(f"Reading {source}")
+
+        # Output columns are known from the header, before any rows are read
+        header, _ = read_rpt_header(source)
+        transform = get_transform(header)
+        output_columns = get_output_columns(header, cols_to_keep)
+        logger.info(f"Selected {len(output_columns)} columns")
+        logger.debug(f"Columns: {output_columns}")
+
+        # Process file in chunks using streaming, sized to the memory budget
+        chunk_size = new_chunk_sizer()
+        stats = new_stats(summary_cols)
+
+        # write under a temporary name, so a crash never leaves a partial
+        # file that looks finished
+        tmp_file = temp_path(out_file)
+
+        try:
+            chunks = stream_rpt_file(
+                source,
+                chunk_size=chunk_size,
+                usecols=get_usecols(cols_to_keep),  # only parse what we write
+                dtypes=column_dtypes,
+                stats=stats,
+                # a local copy is read as is, the share is read ahead
+                readahead_mb=(
+                    None if use_local_copy or staged else readahead_mb
+                ),
             )
+            with Sink(tmp_file, output_columns) as sink:
+                for chunk in metrics.timed_iter("parse", chunks):
+                    msg = f"Processing chunk of {rpt_file.name} with {len(chunk)} rows"  # noqa
+                    logger.debug(msg)
+
+                    with metrics.time("transform", rows=len(chunk)):
+                        chunk = transform(chunk, product_code=rpt_file.stem)
+                    logger.debug("Chunk manipulation complete")
 
-            logger.info(f"Wrote chunk to {out_file}")
-            is_first_chunk = False  # Move this after writing
+                    # Write chunk to file
+                    with metrics.time("write", rows=len(chunk)):
+                        sink.write(chunk)
+                    update_stats(stats, chunk)
+                    logger.debug(f"Wrote chunk to {out_file}")
+
+            index = load_index(rpt_file, index_dir)
+            if index is not None:
+                index.check(stats, filtered)
+
+            # the manifest marks the output as complete and carries the
+            # statistics for combine/summary, so they don't re-read the output
+            source_hash = None
+            if hash_sources:
+                # a second full read of the source, timed on its own
+                with metrics.time("hash", bytes=source.stat().st_size):
+                    source_hash = file_sha256(source)
+            with metrics.time("write"):
+                commit_output(
+                    tmp_file,
+                    out_file,
+                    rpt_file,
+                    stats,
+                    sink.checksum,
+                    config_key=config_key,
+                    source_hash=source_hash,
+                )
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            raise
+        metrics.add("parse", bytes=source.stat().st_size)
+        metrics.add("write", bytes=out_file.stat().st_size)
 
         end = time.perf_counter()
         logger.info(f"Processed {rpt_file.name} in {end - start:.2f}s")
+        return metrics.to_dict(output=str(out_file), seconds=end - start)
 
     except Exception as e:
         logger.error(f"Error with {rpt_file}: {e}")
+        raise
     finally:
-        if local_copy.exists():
+        # cached copies are kept for later runs
+        if rpt_cache is None and local_copy.exists():
             local_copy.unlink()
+
+
+def remove_rpt_parts(parts_dir: Path, stem: str):
+    """Delete the part files and part sidecars of one split RPT.
+
+    Args:
+        parts_dir (Path): The _parts folder the parts were written to
+        stem (str): Stem of the final output, e.g. the product code
+    """
+    for part_file in parts_dir.glob(f"{stem}.part*"):
+        part_file.unlink(missing_ok=True)
+    try:
+        parts_dir.rmdir()
+    except OSError:
+        pass  # parts of other files are still in there
+
+
+def plan_rpt_parts(args, n_parts: int) -> list[tuple]:
+    """Split one process_rpt_file task into byte-range part tasks.
+
+    The header is read once here; every part parses its own range of data
+    lines and writes a part file into a _parts folder next to the final
+    output. If the file has an index, the ranges start on indexed rows and
+    hold the same number of rows rather than bytes. Parts read straight from
+    the source file rather than a local copy.
+
+    Args:
+        args: Argument tuple for process_rpt_file
+        n_parts (int): Number of parts to aim for
+
+    Returns:
+        list[tuple]: Argument tuples for process_rpt_part, in file order
+    """
+    rpt_file, run, run_number, out_dir, _, cols_to_keep = args
+    out_file = get_out_file(out_dir, run, run_number, rpt_file)
+    parts_dir = out_file.parent / "_parts"
+    # leftovers of an earlier split of this file that failed
+    remove_rpt_parts(parts_dir, out_file.stem)
+    parts_dir.mkdir(parents=True, exist_ok=True)
+
+    index = load_index(rpt_file, index_dir)
+    if index is not None:
+        # parts of equal rows rather than equal bytes
+        ranges = index.split_ranges(n_parts)
+    else:
+        _, data_start = read_rpt_header(rpt_file)
+        ranges = split_rpt_ranges(rpt_file, n_parts, data_start)
+    logger.info(f"Splitting {rpt_file.name} into {len(ranges)} parts")
+
+    return [
+        (
+            rpt_file,
+            parts_dir / f"{out_file.stem}.part{i:04d}{out_file.suffix}",
+            cols_to_keep,
+            byte_range,
+        )
+        for i, byte_range in enumerate(ranges)
+    ]
+
+
+def process_rpt_part(args) -> dict:
+    """Reduce one byte range of an RPT file into a part file."""
+    rpt_file, part_file, cols_to_keep, byte_range = args
+    metrics = FileMetrics(str(rpt_file))
+    try:
+        start = time.perf_counter()
+        header, _ = read_rpt_header(rpt_file)
+        transform = get_transform(header)
+        output_columns = get_output_columns(header, cols_to_keep)
+        stats = new_stats(summary_cols)
+
+        chunks = stream_rpt_file(
+            rpt_file,
+            chunk_size=new_chunk_sizer(),
+            usecols=get_usecols(cols_to_keep),
+            dtypes=column_dtypes,
+            byte_range=byte_range,
+            stats=stats,
+            readahead_mb=readahead_mb,
+        )
+        with Sink(part_file, output_columns) as sink:
+            for chunk in metrics.timed_iter("parse", chunks):
+                with metrics.time("transform", rows=len(chunk)):
+                    chunk = transform(chunk, product_code=rpt_file.stem)
+                with metrics.time("write", rows=len(chunk)):
+                    sink.write(chunk)
+                update_stats(stats, chunk)
+
+        write_sidecar(part_file, stats)
+        metrics.add("parse", bytes=byte_range[1] - byte_range[0])
+
+        end = time.perf_counter()
+        logger.info(f"Processed {part_file.name} in {end - start:.2f}s")
+        return metrics.to_dict(output=str(part_file), seconds=end - start)
+
+    except Exception as e:
+        logger.error(f"Error with {part_file}: {e}")
+        raise
+
+
+def stitch_rpt_parts(part_tasks: list[tuple]) -> dict:
+    """Concatenate the part files of a split RPT into the final output.
+
+    Args:
+        part_tasks (list[tuple]): The tasks returned by plan_rpt_parts
+
+    Returns:
+        dict: Metrics of the stitch, including the final output file
+    """
+    start = time.perf_counter()
+    rpt_file = part_tasks[0][0]
+    part_files = [part_file for _, part_file, _, _ in part_tasks]
+    out_file = part_files[0].parent.parent / f"{rpt_file.stem}{Sink.suffix}"
+
+    stats = merge_stats([read_sidecar(p) for p in part_files])
+    index = load_index(rpt_file, index_dir)
+    if index is not None:
+        index.check(stats, filtered)
+
+    tmp_file = temp_path(out_file)
+
+    if Sink is RollupSink:
+        checksum = merge_rollups(part_files, tmp_file)
+    elif Sink.suffix == ".csv":
+        # keep the header of the first part only and copy the raw bytes
+        out = ChecksumFile(tmp_file)
+        with out:
+            for i, part_file in enumerate(part_files):
+                with open(part_file, "rb") as part:
+                    if i > 0:
+                        part.readline()
+                    shutil.copyfileobj(part, out, length=16 * 1024 * 1024)
+        checksum = out.hexdigest()
+    else:
+        output_columns = read_output_columns(part_files[0])
+        with Sink(tmp_file, output_columns) as sink:
+            for part_file in part_files:
+                for chunk in read_output_chunks(part_file):
+                    sink.write(chunk)
+        checksum = sink.checksum
+
+    cols_to_keep = part_tasks[0][2]
+    metrics = FileMetrics(str(rpt_file))
+    source_hash = None
+    hash_seconds = 0.0
+    if hash_sources:
+        hash_start = time.perf_counter()
+        source_hash = file_sha256(rpt_file)
+        hash_seconds = time.perf_counter() - hash_start
+        metrics.add("hash", hash_seconds, bytes=rpt_file.stat().st_size)
+    commit_output(
+        tmp_file,
+        out_file,
+        rpt_file,
+        stats,
+        checksum,
+        config_key=get_config_key(cols_to_keep),
+        source_hash=source_hash,
+    )
+
+    remove_rpt_parts(part_files[0].parent, out_file.stem)
+
+    logger.info(f"Stitched {len(part_files)} parts into {out_file}")
+    metrics.add(
+        "write",
+        time.perf_counter() - start - hash_seconds,
+        bytes=out_file.stat().st_size,
+    )
+    return metrics.to_dict(output=str(out_file))
+
+
+def get_rollup_file(out_dir: Path, run: str, run_number: str) -> Path:
+    """Path of the merged rollup of a run."""
+    return out_dir / f"rollup_#288.{run}_RUN_{run_number}.csv"
+
+
+def write_run_rollup(out_dir: Path, run: str, run_number: str) -> Path | None:
+    """Merge the per-file rollups of a run into one rollup for the run.
+
+    Args:
+        out_dir (Path): Output folder of the reduction
+        run (str): Run, e.g. "408" for #288.408
+        run_number (str): Run number, e.g. "179"
+
+    Returns:
+        Path | None: The run rollup, or None if the run has no rollups
+    """
+    run_dir = out_dir / f"#288.{run}" / f"RUN_{run_number}"
+    rollup_files = sorted(run_dir.glob(f"*{RollupSink.suffix}"))
+    # rollups made with other keys or measures can't be merged
+    config_key = get_config_key(default_cols_to_keep)
+    complete = [
+        file for file in rollup_files if is_complete(file, config_key=config_key)  # noqa
+    ]
+    if len(complete) < len(rollup_files):
+        logger.warning(
+            f"Leaving {len(rollup_files) - len(complete)} incomplete or "
+            f"out of date rollups out of #288.{run} RUN_{run_number}"
+        )
+    if not complete:
+        return None
+
+    rollup_file = get_rollup_file(out_dir, run, run_number)
+    tmp_file = temp_path(rollup_file)
+    merge_rollups(complete, tmp_file)
+    os.replace(tmp_file, rollup_file)
+    logger.info(f"Merged {len(complete)} rollups into {rollup_file}")
+    return rollup_file
@@ -0,0 +1,362 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from src.io import encoding, parse_rpt_header, resolve_usecols, rows_to_frame
+from src.logger import logger
+from src.sidecar import temp_path
+
+NEWLINE = ord("\n")
+COMMA = ord(",")
+STAR = ord("*")
+
+
+def read_header_offsets(rpt_file: Path) -> tuple[list[str], int, int]:
+    """Header of an RPT file with the offsets of the header line and of the
+    line after it."""
+    with open(rpt_file, "rb") as file:
+        offset = 0
+        for raw in iter(file.readline, b""):
+            header = parse_rpt_header(raw.decode(encoding))
+            if header is not None:
+                return header, offset, offset + len(raw)
+            offset += len(raw)
+    raise ValueError(f"No header row found in {rpt_file}")
+
+
+def _is_row(line: bytes, n_columns: int) -> bool:
+    """Whether a raw line is a data row that stream_rpt_file would keep."""
+    return line[:1] == b"*" and line[1:2] in (b",", b"\r", b"\n", b"") and line.count(b",") == n_columns  # noqa
+
+
+class RptIndex:
+    """Line-offset index of the data rows of an RPT file.
+
+    Built once with a bytes-level scan of the file (no decoding or
+    splitting), it holds the offset of the header, the offset of every
+    `every`-th data row and the number of good and malformed data rows. Row
+    counts then come for free, and sampling or splitting the file only reads
+    the rows it needs.
+
+    A data row is a line starting with "*" with one field per header column,
+    the same rows stream_rpt_file keeps; lines starting with "*" with any
+    other number of fields are counted as malformed.
+
+    Args:
+        rpt_file (Path): The indexed RPT file
+        header (list[str]): Column names from the header row
+        header_offset (int): Byte offset of the header line
+        data_start (int): Byte offset of the line after the header
+        every (int): Distance in rows between indexed offsets
+        offsets (np.ndarray): Byte offsets of rows 0, every, 2 * every, ...
+        row_count (int): Number of data rows
+        malformed_rows (int): Number of malformed data rows
+        size (int): Size of the file when it was indexed
+        mtime_ns (int): Modification time of the file when it was indexed
+    """
+
+    def __init__(
+        self,
+        rpt_file: Path,
+        header: list[str],
+        header_offset: int,
+        data_start: int,
+        every: int,
+        offsets: np.ndarray,
+        row_count: int,
+        malformed_rows: int,
+        size: int,
+        mtime_ns: int,
+    ):
+        self.rpt_file = Path(rpt_file)
+        self.header = header
+        self.header_offset = header_offset
+        self.data_start = data_start
+        self.every = every
+        self.offsets = offsets
+        self.row_count = row_count
+        self.malformed_rows = malformed_rows
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def build(
+        cls,
+        rpt_file: Path,
+        every: int = 10_000,
+        block_size: int = 16 * 1024**2,
+    ) -> "RptIndex":
+        """Index an RPT file, reading it in large blocks.
+
+        Lines are found and their fields counted with numpy on whole blocks,
+        so the scan runs at close to disk (or network) speed.
+
+        Args:
+            rpt_file (Path): RPT file to index
+            every (int): Keep the offset of every this many rows
+            block_size (int): Bytes read at a time
+
+        Returns:
+            RptIndex: The index of the file
+        """
+        stat = rpt_file.stat()
+        header, header_offset, data_start = read_header_offsets(rpt_file)
+        n_columns = len(header)
+
+        offsets = []
+        row_count = 0
+        malformed_rows = 0
+        with open(rpt_file, "rb") as file:
+            file.seek(data_start)
+            base = data_start  # offset of the start of buf
+            carry = b""
+            while True:
+                block = file.read(block_size)
+                buf = carry + block
+                if not block:
+                    # a last line without a newline
+                    if buf:
+                        buf += b"\n"
+                    else:
+                        break
+                arr = np.frombuffer(buf, dtype=np.uint8)
+                ends = np.flatnonzero(arr == NEWLINE)
+                if len(ends) == 0:
+                    carry = buf
+                    continue
+                starts = np.concatenate(([0], ends[:-1] + 1))
+
+                # fields per line, from the number of commas before its end
+                commas = np.flatnonzero(arr[: ends[-1]] == COMMA)
+                n_commas = np.diff(np.searchsorted(commas, ends), prepend=0)
+
+                second = arr[np.minimum(starts + 1, ends)]
+                is_data = (arr[starts] == STAR) & np.isin(
+                    second, (COMMA, NEWLINE, ord("\r"))
+                )
+                good = is_data & (n_commas == n_columns)
+                malformed_rows += int(np.count_nonzero(is_data & ~good))
+
+                # keep the rows whose number is a multiple of every
+                row_starts = starts[good]
+                first = -row_count % every
+                offsets.append(base + row_starts[first::every])
+                row_count += len(row_starts)
+
+                consumed = int(ends[-1]) + 1
+                carry = buf[consumed:]
+                base += consumed
+                if not block:
+                    break
+
+        offsets = np.concatenate(offsets) if offsets else np.empty(0)
+        index = cls(
+            rpt_file,
+            header,
+            header_offset,
+            data_start,
+            every,
+            offsets.astype(np.int64),
+            row_count,
+            malformed_rows,
+            stat.st_size,
+            stat.st_mtime_ns,
+        )
+        logger.info(
+            f"Indexed {rpt_file.name}: {row_count} rows, "
+            f"{malformed_rows} malformed"
+        )
+        return index
+
+    def is_current(self) -> bool:
+        """Whether the file is unchanged since it was indexed."""
+        try:
+            stat = self.rpt_file.stat()
+        except FileNotFoundError:
+            return False
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns  # noqa
+
+    def save(self, index_file: Path) -> Path:
+        """Write the index under a temporary name and rename it into place."""
+        meta = {
+            "rpt_file": str(self.rpt_file),
+            "header": self.header,
+            "header_offset": self.header_offset,
+            "data_start": self.data_start,
+            "every": self.every,
+            "row_count": self.row_count,
+            "malformed_rows": self.malformed_rows,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+        }
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = temp_path(index_file)
+        # np.savez would add .npz to a file name, so hand it a file
+        with open(tmp_file, "wb") as file:
+            np.savez(
+                file, offsets=self.offsets, meta=np.array(json.dumps(meta))
+            )
+        os.replace(tmp_file, index_file)
+        return index_file
+
+    @classmethod
+    def load(cls, index_file: Path) -> "RptIndex":
+        with np.load(index_file, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            offsets = data["offsets"]
+        rpt_file = Path(meta.pop("rpt_file"))
+        return cls(rpt_file, offsets=offsets, **meta)
+
+    def row_offset(self, row: int) -> tuple[int, int]:
+        """Offset of the nearest indexed row at or before a row, and the
+        number of rows from there to the row."""
+        if not 0 <= row < self.row_count:
+            raise IndexError(f"Row {row} out of range for {self.rpt_file}")
+        return int(self.offsets[row // self.every]), row % self.every
+
+    def split_ranges(self, n_parts: int) -> list[tuple[int, int]]:
+        """Split the data section into byte ranges of about the same number
+        of rows, like split_rpt_ranges but balanced on rows.
+
+        Args:
+            n_parts (int): Number of ranges to aim for
+
+        Returns:
+            list[tuple[int, int]]: Ordered, non-empty (start, end) byte
+                ranges covering the data section
+        """
+        boundaries = [self.data_start]
+        for i in range(1, n_parts):
+            k = round(i * len(self.offsets) / n_parts)
+            if 0 < k < len(self.offsets):
+                boundary = int(self.offsets[k])
+                if boundary > boundaries[-1]:
+                    boundaries.append(boundary)
+        if self.size > boundaries[-1]:
+            boundaries.append(self.size)
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def read_rows(self, rows: list[int]) -> list[list[str]]:
+        """Read data rows by number, seeking to the nearest indexed row.
+
+        Args:
+            rows (list[int]): Row numbers, from 0
+
+        Returns:
+            list[list[str]]: The fields of each row, without the "*" marker,
+                in the order of the row numbers
+        """
+        n_columns = len(self.header)
+        found = {}
+        with open(self.rpt_file, "rb", buffering=1024**2) as reader:
+            position = None  # row number the reader is at
+            for row in sorted(set(rows)):
+                offset, skip = self.row_offset(row)
+                if position is None or not (row - skip <= position <= row):
+                    reader.seek(offset)
+                    position = row - skip
+                while True:
+                    line = reader.readline()
+                    if not line:
+                        raise ValueError(f"{self.rpt_file} changed since it was indexed")  # noqa
+                    if not _is_row(line, n_columns):
+                        continue
+                    if position == row:
+                        parts = line.decode(encoding).strip().split(",")
+                        found[row] = [val.strip('"') for val in parts[1:]]
+                        position += 1
+                        break
+                    position += 1
+        return [found[row] for row in rows]
+
+    def sample(
+        self,
+        n: int,
+        seed: int | None = None,
+        usecols: list[str] | None = None,
+        dtypes: dict[str, str] | None = None,
+    ) -> pd.DataFrame:
+        """Random sample of data rows, read without parsing the rest of
+        the file.
+
+        Args:
+            n (int): Number of rows, at most the number of rows of the file
+            seed (int | None): Seed of the random choice
+            usecols (list[str] | None): Only keep these columns
+            dtypes (dict[str, str] | None): Column schema, see rows_to_frame
+
+        Returns:
+            pd.DataFrame: The sampled rows, in file order
+        """
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(self.row_count, size=min(n, self.row_count), replace=False))  # noqa
+        values = self.read_rows(rows.tolist())
+        columns, col_idx = resolve_usecols(self.header, usecols)
+        if col_idx is not None:
+            # read_rows drops the "*" marker
+            values = [[row[i - 1] for i in col_idx] for row in values]
+        return rows_to_frame(values, columns, dtypes)
+
+    def check(self, stats: dict, filtered: bool = False):
+        """Check the statistics of a reduced output against the index.
+
+        Args:
+            stats (dict): Statistics of the output, see new_stats
+            filtered (bool): Rows were filtered out after parsing, so only
+                the malformed rows are compared
+
+        Raises:
+            ValueError: If the output is missing rows
+        """
+        expected = {"rejected_rows": self.malformed_rows}
+        if not filtered:
+            expected["row_count"] = self.row_count
+        for key, count in expected.items():
+            if stats[key] != count:
+                raise ValueError(
+                    f"{self.rpt_file.name}: {key} is {count} in its index "
+                    f"but {stats[key]} in the output"
+                )
+
+
+def index_path(rpt_file: Path, index_dir: Path) -> Path:
+    """File holding the index of an RPT file, unique per source path."""
+    key = hashlib.sha256(str(rpt_file).encode()).hexdigest()[:16]
+    return index_dir / f"{rpt_file.stem}_{key}.idx.npz"
+
+
+def load_index(rpt_file: Path, index_dir: Path | None) -> RptIndex | None:
+    """The index of an RPT file if it exists and is up to date.
+
+    Args:
+        rpt_file (Path): The RPT file
+        index_dir (Path | None): Folder holding the indexes, None if indexes
+            are disabled
+
+    Returns:
+        RptIndex | None: The index, or None if there is no current index
+    """
+    if index_dir is None:
+        return None
+    index_file = index_path(rpt_file, index_dir)
+    try:
+        index = RptIndex.load(index_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable index {index_file}: {e}")
+        return None
+    return index if index.is_current() else None
+
+
+def get_index(
+    rpt_file: Path, index_dir: Path, every: int = 10_000
+) -> RptIndex:
+    """Load the index of an RPT file, building it first if needed."""
+    index = load_index(rpt_file, index_dir)
+    if index is None or index.every != every:
+        index = RptIndex.build(rpt_file, every)
+        index.save(index_path(rpt_file, index_dir))
+    return index
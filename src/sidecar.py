@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import pandas as pd
+
+
+def sidecar_path(out_file: Path) -> Path:
+    """Path of the JSON sidecar written next to a reduced output."""
+    return out_file.with_suffix(".json")
+
+
+def temp_path(file_path: Path) -> Path:
+    """Temporary name a file is written under before it is renamed."""
+    return file_path.with_name(f"{file_path.name}.tmp")
+
+
+def write_sidecar(out_file: Path, data: dict) -> Path:
+    """Write the sidecar of a reduced output.
+
+    Args:
+        out_file (Path): The reduced output
+        data (dict): JSON serialisable data
+
+    Returns:
+        Path: The sidecar file
+    """
+    path = sidecar_path(out_file)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_sidecar(out_file: Path) -> dict | None:
+    """Read the sidecar of a reduced output.
+
+    Args:
+        out_file (Path): The reduced output
+
+    Returns:
+        dict | None: The sidecar data, or None if there is no sidecar
+    """
+    path = sidecar_path(out_file)
+    if not path.exists():
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def new_stats(sum_columns: list[str]) -> dict:
+    """Empty per-file statistics, accumulated while a file is reduced.
+
+    Args:
+        sum_columns (list[str]): Numeric columns to sum
+
+    Returns:
+        dict: Row count, rejected row count and column sums
+    """
+    return {
+        "row_count": 0,
+        "rejected_rows": 0,
+        "sums": {col: 0.0 for col in sum_columns},
+    }
+
+
+def update_stats(stats: dict, chunk: pd.DataFrame) -> dict:
+    """Add a chunk of reduced rows to the statistics."""
+    stats["row_count"] += len(chunk)
+    for col in stats["sums"]:
+        if col in chunk.columns:
+            values = pd.to_numeric(chunk[col], errors="coerce")
+            stats["sums"][col] += float(values.sum())
+    return stats
+
+
+def merge_stats(all_stats: list[dict]) -> dict:
+    """Combine the statistics of several parts of the same file."""
+    merged = new_stats(list(all_stats[0]["sums"]))
+    for stats in all_stats:
+        merged["row_count"] += stats["row_count"]
+        merged["rejected_rows"] += stats["rejected_rows"]
+        for col, total in stats["sums"].items():
+            merged["sums"][col] += total
+    return merged
+
+
+def summary_row(file_name: str, stats: dict) -> dict:
+    """Convert file statistics into a row of the combine summary."""
+    row = {"file_name": file_name, "row_count": stats["row_count"]}
+    for col, total in stats["sums"].items():
+        row[f"{col.lower()}_sum"] = total
+    row["rejected_rows"] = stats["rejected_rows"]
+    return row
+
+
+def file_sha256(file_path: Path, block_size: int = 16 * 1024**2) -> str:
+    """SHA-256 of a file's contents, read in large blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(rpt_file: Path, content_hash: str | None = None) -> dict:  # noqa
+    """Identify the version of a source RPT file by its size and mtime.
+
+    Args:
+        rpt_file (Path): The source RPT file
+        content_hash (str | None): SHA-256 of the contents, if it was computed
+
+    Returns:
+        dict: The fingerprint
+    """
+    stat = rpt_file.stat()
+    fingerprint = {
+        "path": str(rpt_file),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    if content_hash is not None:
+        fingerprint["sha256"] = content_hash
+    return fingerprint
+
+
+def config_fingerprint(
+    cols_to_keep: list[str],
+    is_omp: bool,
+    transforms: list[dict] | None = None,
+    summary_cols: list[str] | None = None,
+    rollup: dict | None = None,
+) -> str:
+    """Identify the configuration an output was reduced with.
+
+    Args:
+        cols_to_keep (list[str]): Columns written to the output
+        is_omp (bool): Whether the files are OMP files
+        transforms (list[dict] | None): Chunk transforms, see ChunkTransform
+        summary_cols (list[str] | None): Columns summed into the manifest
+        rollup (dict | None): Keys and measures of rollup outputs, None for
+            other output formats
+
+    Returns:
+        str: SHA-256 of the configuration
+    """
+    config = {"cols_to_keep": list(cols_to_keep), "is_omp": is_omp}
+    if transforms:
+        config["transforms"] = transforms
+    if summary_cols is not None:
+        config["summary_cols"] = list(summary_cols)
+    if rollup is not None:
+        config["rollup"] = rollup
+    return hashlib.sha256(json.dumps(config).encode()).hexdigest()
+
+
+def commit_output(
+    tmp_file: Path,
+    out_file: Path,
+    rpt_file: Path,
+    stats: dict,
+    checksum: str,
+    config_key: str | None = None,
+    source_hash: str | None = None,
+) -> Path:
+    """Move a finished output into place and record its manifest.
+
+    The output is renamed from its temporary name first and the sidecar is
+    written last, so a sidecar only ever exists for a complete output.
+
+    Args:
+        tmp_file (Path): The finished output under its temporary name
+        out_file (Path): The final output path
+        rpt_file (Path): The source RPT file
+        stats (dict): Statistics accumulated while reducing
+        checksum (str): SHA-256 of the output
+        config_key (str | None): See config_fingerprint
+        source_hash (str | None): SHA-256 of the source contents, if known
+
+    Returns:
+        Path: The final output path
+    """
+    os.replace(tmp_file, out_file)
+    manifest = {
+        **stats,
+        "source": source_fingerprint(rpt_file, source_hash),
+        "config": config_key,
+        "output": {"size": out_file.stat().st_size, "sha256": checksum},
+    }
+    write_sidecar(out_file, manifest)
+    return out_file
+
+
+def is_complete(
+    out_file: Path,
+    rpt_file: Path | None = None,
+    config_key: str | None = None,
+    check_hash: bool = False,
+) -> bool:
+    """Check an output against its manifest.
+
+    Args:
+        out_file (Path): The reduced output
+        rpt_file (Path | None): If given, the output also has to have been
+            made from the current version of this source file
+        config_key (str | None): If given, the output also has to have been
+            made with this configuration, see config_fingerprint
+        check_hash (bool): If the source mtime changed but its size did not,
+            compare the contents against the recorded hash (if there is one)
+            instead of treating the source as changed. If they match, the
+            new mtime is written to the manifest.
+
+    Returns:
+        bool: True if the output is complete (and up to date)
+    """
+    manifest = read_sidecar(out_file)
+    if manifest is None or "output" not in manifest or not out_file.exists():
+        return False
+    if out_file.stat().st_size != manifest["output"]["size"]:
+        return False
+    if config_key is not None and manifest.get("config") != config_key:
+        return False
+    if rpt_file is not None:
+        source = source_fingerprint(rpt_file)
+        recorded = manifest["source"]
+        if source["size"] != recorded["size"]:
+            return False
+        if source["mtime_ns"] != recorded["mtime_ns"]:
+            # touched by a re-run, but the contents may be unchanged
+            if not (check_hash and "sha256" in recorded):
+                return False
+            if file_sha256(rpt_file) != recorded["sha256"]:
+                return False
+            # record the new mtime, so the next plan doesn't hash it again
+            recorded["mtime_ns"] = source["mtime_ns"]
+            write_sidecar(out_file, manifest)
+    return True
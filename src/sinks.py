@@ -0,0 +1,464 @@
+import abc
+import csv
+import hashlib
+from pathlib import Path
+from typing import BinaryIO, Iterator, List
+import pandas as pd
+from src.columns import rollup_keys, rollup_measures
+from src.chunking import ChunkSizer
+
+
+def _import_pyarrow():
+    """Import pyarrow, which is only needed for the columnar sinks."""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for parquet/arrow output, "
+            "install it with `pip install pyarrow`"
+        ) from e
+    return pa
+
+
+class ChecksumFile:
+    """Binary file that keeps a SHA-256 of everything written to it.
+
+    Text written to it is encoded as UTF-8, the encoding pandas reads the
+    outputs back with, so it can be handed to both DataFrame.to_csv and the
+    pyarrow writers.
+
+    Parameters
+    ----------
+    file_path : Path or binary file
+        Path to the file, opened for writing, or an open binary file such
+        as a member of a zip archive
+    """
+
+    def __init__(self, file_path: Path | BinaryIO):
+        if isinstance(file_path, (str, Path)):
+            file_path = open(file_path, "wb")
+        self._file = file_path
+        self._hash = hashlib.sha256()
+
+    def write(self, data: bytes | str) -> int:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink:
+    """Write chunks of a reduced RPT file to a single CSV file.
+
+    The file is opened once and the header is written straight away, so an
+    output with no rows still has its header. A checksum of the written
+    bytes is available once the sink is closed.
+
+    Parameters
+    ----------
+    out_file : Path or binary file
+        Path to output file, or an open binary file to write to
+    columns : List[str]
+        Columns to write, in order
+    """
+
+    suffix = ".csv"
+
+    def __init__(self, out_file: Path | BinaryIO, columns: List[str]):
+        self.out_file = out_file
+        self.columns = columns
+        self._file = ChecksumFile(out_file)
+        self._write(pd.DataFrame(columns=columns), header=True)
+
+    def _write(self, df: pd.DataFrame, header: bool = False):
+        df[self.columns].to_csv(
+            self._file,
+            header=header,
+            index=False,
+            quoting=csv.QUOTE_MINIMAL,  # Only quote when necessary
+            escapechar="\\",  # Use backslash as escape character
+        )
+
+    def write(self, df: pd.DataFrame):
+        self._write(df)
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def checksum(self) -> str:
+        return self._file.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _ArrowSink(abc.ABC):
+    """Shared logic for the pyarrow based sinks.
+
+    The schema is taken from the first chunk; later chunks are converted to
+    the same schema so every batch lines up.
+    """
+
+    suffix = ""
+
+    def __init__(self, out_file: Path, columns: List[str]):
+        self.pa = _import_pyarrow()
+        self.out_file = out_file
+        self.columns = columns
+        self.schema = None
+        self._writer = None
+        self._file = ChecksumFile(out_file)
+
+    def _to_table(self, df: pd.DataFrame):
+        pa = self.pa
+        table = pa.Table.from_pandas(
+            df[self.columns], schema=self.schema, preserve_index=False
+        )
+        if self.schema is None:
+            # columns that are entirely empty in the first chunk are strings
+            fields = [
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f  # noqa
+                for f in table.schema
+            ]
+            self.schema = pa.schema(fields)
+            table = table.cast(self.schema)
+        return table
+
+    @abc.abstractmethod
+    def _open_writer(self):
+        """Open the pyarrow writer on the file, once the schema is known."""
+
+    def write(self, df: pd.DataFrame):
+        table = self._to_table(df)
+        if self._writer is None:
+            self._writer = self._open_writer()
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is None:
+            # no rows were written, still leave a readable (empty) file
+            self.write(pd.DataFrame(columns=self.columns))
+        self._writer.close()
+        self._file.close()
+
+    @property
+    def checksum(self) -> str:
+        return self._file.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetSink(_ArrowSink):
+    """Write chunks to a Parquet file, one row group per chunk.
+
+    String columns are dictionary encoded.
+    """
+
+    suffix = ".parquet"
+
+    def _open_writer(self):
+        pa = self.pa
+        string_cols = [
+            f.name
+            for f in self.schema
+            if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)
+        ]
+        return pa.parquet.ParquetWriter(
+            self._file, self.schema, use_dictionary=string_cols
+        )
+
+
+class ArrowSink(_ArrowSink):
+    """Write chunks to an Arrow IPC file, one record batch per chunk."""
+
+    suffix = ".arrow"
+
+    def _open_writer(self):
+        return self.pa.ipc.new_file(self._file, self.schema)
+
+
+def _combine_rollups(partials: List[pd.DataFrame]) -> pd.DataFrame:
+    """Merge partial rollups (indexed by the group keys) into one."""
+    if len(partials) == 1:
+        return partials[0]
+    merged = pd.concat(partials)
+    return merged.groupby(
+        level=list(range(merged.index.nlevels)), dropna=False, sort=False
+    ).sum()
+
+
+class RollupSink:
+    """Fold chunks into group totals instead of writing their rows.
+
+    Rows are grouped by the key columns and, per group, the sum and the
+    number of non-missing values of every measure are kept, along with the
+    row count. Partial totals are merged every `merge_every` chunks, so
+    memory is bound by the number of groups, not rows. The CSV written on
+    close holds one row per group.
+
+    Parameters
+    ----------
+    out_file : Path
+        Path to output file
+    columns : List[str]
+        Columns of the reduced rows; keys and measures missing from it are
+        left out
+    keys : List[str] | None, optional
+        Group columns, by default rollup_keys from src/columns.py
+    measures : List[str] | None, optional
+        Numeric columns to total, by default rollup_measures
+    merge_every : int, optional
+        Number of chunk totals held before they are merged, by default 64
+    """
+
+    suffix = ".rollup.csv"
+
+    def __init__(
+        self,
+        out_file: Path,
+        columns: List[str],
+        keys: List[str] | None = None,
+        measures: List[str] | None = None,
+        merge_every: int = 64,
+    ):
+        self.out_file = out_file
+        self.keys = [col for col in keys or rollup_keys if col in columns]
+        self.measures = [
+            col for col in measures or rollup_measures if col in columns
+        ]
+        if not self.keys:
+            raise ValueError("None of the rollup keys are in the columns")
+        self.merge_every = merge_every
+        self._partials = []
+        self._file = ChecksumFile(out_file)
+
+    def write(self, df: pd.DataFrame):
+        groups = df.groupby(self.keys, dropna=False, observed=True, sort=False)
+        totals = groups[self.measures].agg(["sum", "count"])
+        totals.columns = [f"{col}_{agg}" for col, agg in totals.columns]
+        totals["row_count"] = groups.size()
+        self._partials.append(totals)
+        if len(self._partials) >= self.merge_every:
+            self._partials = [_combine_rollups(self._partials)]
+
+    def close(self):
+        if self._partials:
+            totals = _combine_rollups(self._partials).sort_index()
+            rollup = totals.reset_index()
+        else:
+            columns = [f"{col}_{agg}" for col in self.measures for agg in ("sum", "count")]  # noqa
+            rollup = pd.DataFrame(columns=self.keys + columns + ["row_count"])
+        rollup.to_csv(self._file, index=False)
+        self._file.close()
+
+    @property
+    def checksum(self) -> str:
+        return self._file.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def merge_rollups(
+    rollup_files: List[Path],
+    out_file: Path,
+    keys: List[str] | None = None,
+) -> str:
+    """Merge the rollups of several files (or parts) into one.
+
+    Parameters
+    ----------
+    rollup_files : List[Path]
+        Rollups written by RollupSink
+    out_file : Path
+        Path to the merged rollup
+    keys : List[str] | None, optional
+        Group columns, by default rollup_keys from src/columns.py
+
+    Returns
+    -------
+    str
+        SHA-256 of the merged file
+    """
+    partials = []
+    for rollup_file in rollup_files:
+        columns = read_output_columns(rollup_file)
+        file_keys = [col for col in keys or rollup_keys if col in columns]
+        rollup = pd.read_csv(
+            rollup_file,
+            dtype={col: str for col in file_keys},
+            keep_default_na=False,
+        )
+        partials.append(rollup.set_index(file_keys))
+
+    totals = _combine_rollups(partials).sort_index()
+    with ChecksumFile(out_file) as out:
+        totals.reset_index().to_csv(out, index=False)
+    return out.hexdigest()
+
+
+sinks = {
+    "csv": CsvSink,
+    "parquet": ParquetSink,
+    "arrow": ArrowSink,
+    "rollup": RollupSink,
+}
+
+
+def get_sink(output_format: str):
+    """Look up the sink class for an output format.
+
+    Parameters
+    ----------
+    output_format : str
+        One of "csv", "parquet", "arrow" or "rollup"
+
+    Returns
+    -------
+    type
+        Sink class, instantiate with (out_file, columns)
+    """
+    try:
+        return sinks[output_format]
+    except KeyError:
+        raise ValueError(
+            f"Unknown output format {output_format}, use one of {list(sinks)}"
+        ) from None
+
+
+def read_output_columns(file_path: Path) -> List[str]:
+    """Read the column names of a reduced output file.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path to a .csv, .parquet or .arrow output
+
+    Returns
+    -------
+    List[str]
+        Column names
+    """
+    if file_path.suffix == ParquetSink.suffix:
+        pa = _import_pyarrow()
+        return pa.parquet.read_schema(file_path).names
+    if file_path.suffix == ArrowSink.suffix:
+        pa = _import_pyarrow()
+        with pa.ipc.open_file(file_path) as reader:
+            return reader.schema.names
+    return pd.read_csv(file_path, nrows=0).columns.tolist()
+
+
+def read_output_chunks(
+    file_path: Path,
+    chunk_size: int | ChunkSizer = 10_000,
+    columns: List[str] | None = None,
+    **csv_args,
+) -> Iterator[pd.DataFrame]:
+    """Read a reduced output file back in chunks.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path to a .csv, .parquet or .arrow output
+    chunk_size : int | ChunkSizer, optional
+        Rows per chunk for CSV and Parquet, by default 10000. With a
+        ChunkSizer, CSV chunks are sized on the memory use of a first probe
+        chunk and Parquet chunks on the uncompressed size in the file
+        metadata. Arrow IPC files are read one record batch at a time.
+    columns : List[str] | None, optional
+        Only read these columns, by default all columns
+    **csv_args
+        Passed to pd.read_csv for CSV files
+
+    Yields
+    ------
+    pd.DataFrame
+        Chunks of the output
+    """
+    sizer = chunk_size if isinstance(chunk_size, ChunkSizer) else None
+
+    if file_path.suffix == ParquetSink.suffix:
+        pa = _import_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(file_path)
+        if sizer is not None:
+            metadata = parquet_file.metadata
+            if metadata.num_rows:
+                total = sum(
+                    metadata.row_group(i).total_byte_size
+                    for i in range(metadata.num_row_groups)
+                )
+                width = len(columns) if columns else metadata.num_columns
+                sizer.size_for(
+                    total / metadata.num_rows * width / metadata.num_columns
+                )
+            chunk_size = sizer.rows
+        for batch in parquet_file.iter_batches(
+            batch_size=chunk_size, columns=columns
+        ):
+            yield batch.to_pandas()
+    elif file_path.suffix == ArrowSink.suffix:
+        pa = _import_pyarrow()
+        with pa.ipc.open_file(file_path) as reader:
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                yield batch.to_pandas()
+    elif sizer is None:
+        yield from pd.read_csv(
+            file_path, chunksize=chunk_size, usecols=columns, **csv_args
+        )
+    else:
+        with pd.read_csv(
+            file_path, iterator=True, usecols=columns, **csv_args
+        ) as reader:
+            while True:
+                try:
+                    chunk = reader.get_chunk(sizer.rows)
+                except StopIteration:
+                    return
+                if not sizer.measured:
+                    sizer.observe(chunk)
+                yield chunk
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from src.logger import logger
+from src.metrics import FileMetrics
+from src.cache import RptCache
+
+
+def staged_path(staging_dir: Path, rpt_file: Path) -> Path:
+    """Local copy of an RPT file, unique per source path.
+
+    Every run folder holds the same product file names, so the name alone
+    would let copies of different runs overwrite each other.
+    """
+    key = hashlib.sha256(str(rpt_file).encode()).hexdigest()[:16]
+    return staging_dir / f"{rpt_file.stem}_{key}{rpt_file.suffix}"
+
+
+class Stager:
+    """Copy upcoming RPT files to local disk ahead of the parser workers.
+
+    A small pool of copier threads stages files into `staging_dir` while
+    earlier files are being parsed. The bytes staged but not yet released
+    are kept under `budget_bytes`; a copy waits until enough staged files
+    have been processed and released. A file bigger than the whole budget
+    is only copied once nothing else is staged.
+
+    Files are copied under a temporary name and renamed when complete, so
+    process_rpt_file never picks up a partial copy.
+
+    With a cache, files are staged into the cache instead and are left
+    there when released; they are pinned until then, so the cache only
+    evicts them once they have been parsed.
+
+    Args:
+        staging_dir (Path): Local directory to copy into
+        budget_bytes (int): Maximum number of staged bytes on disk
+        max_workers (int): Number of concurrent copies
+        cache (RptCache | None): Persistent cache to stage into
+    """
+
+    def __init__(
+        self,
+        staging_dir: Path,
+        budget_bytes: int,
+        max_workers: int = 2,
+        cache: RptCache | None = None,
+    ):
+        self.staging_dir = staging_dir
+        self.budget_bytes = budget_bytes
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="stager"
+        )
+        self._staged = {}  # source path -> (size, path) of its staged copy
+        self._used = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _reserve(self, size: int):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._closed
+                or self._used == 0
+                or self._used + size <= self.budget_bytes
+            )
+            if self._closed:
+                raise RuntimeError("Stager was shut down")
+            self._used += size
+
+    def _copy(self, rpt_file: Path) -> dict:
+        size = rpt_file.stat().st_size
+        self._reserve(size)
+        local_copy = staged_path(self.staging_dir, rpt_file)
+        with self._condition:
+            self._staged[rpt_file] = (size, local_copy)
+
+        metrics = FileMetrics(str(rpt_file))
+        if self.cache is not None:
+            try:
+                start = time.perf_counter()
+                local_copy, hit = self.cache.fetch(rpt_file, pin=True)
+                with self._condition:
+                    self._staged[rpt_file] = (size, local_copy)
+                if not hit:
+                    metrics.add("copy", time.perf_counter() - start, bytes=size)  # noqa
+            except Exception:
+                self.release(rpt_file)
+                raise
+            return metrics.to_dict(output=str(local_copy), cached=hit)
+
+        tmp_copy = local_copy.with_name(f"{local_copy.name}.tmp")
+        try:
+            logger.info(f"Staging {rpt_file} to {local_copy}")
+            with metrics.time("copy", bytes=size):
+                shutil.copy2(rpt_file, tmp_copy)
+                os.replace(tmp_copy, local_copy)
+        except Exception:
+            if tmp_copy.exists():
+                tmp_copy.unlink()
+            self.release(rpt_file)
+            raise
+        return metrics.to_dict(output=str(local_copy))
+
+    def stage(self, rpt_file: Path) -> Future:
+        """Queue an RPT file for copying.
+
+        Args:
+            rpt_file (Path): The source RPT file
+
+        Returns:
+            Future: Resolves to the copy metrics, with the path of the local
+                copy as "output"
+        """
+        return self._executor.submit(self._copy, rpt_file)
+
+    def release(self, rpt_file: Path):
+        """Return the budget of a staged file once it has been processed.
+
+        Deletes the local copy if the parser did not already remove it,
+        unless it is kept in the cache.
+        """
+        with self._condition:
+            size, local_copy = self._staged.pop(rpt_file, (0, None))
+            self._used -= size
+            self._condition.notify_all()
+        if local_copy is None:
+            return
+        if self.cache is not None:
+            self.cache.unpin(local_copy)
+        else:
+            local_copy.unlink(missing_ok=True)
+
+    def shutdown(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from src.logger import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # the pandas string methods are used instead
+    pa = None
+
+
+def _split(chunk: pd.DataFrame, step: dict, context: dict) -> pd.DataFrame:
+    """Split a string column on a separator into new columns.
+
+    Missing parts, and the parts of missing values, become NaN.
+    """
+    source = chunk[step["column"]]
+    into = step["into"]
+
+    if pa is not None:
+        # one pass over the strings, the parts are picked out of the flat
+        # list values by their offsets instead of building a frame of parts
+        strings = pa.array(source.to_numpy(dtype=object), type=pa.string(), from_pandas=True)  # noqa
+        lists = pc.split_pattern(strings, step["sep"])
+        offsets = lists.offsets.to_numpy()
+        lengths = np.diff(offsets)
+        for i, col in enumerate(into):
+            has_part = lengths > i
+            if not has_part.any():
+                chunk[col] = np.full(len(chunk), None, dtype=object)
+                continue
+            index = pa.array(np.where(has_part, offsets[:-1] + i, 0))
+            part = lists.values.take(index)
+            part = pc.if_else(pa.array(has_part), part, None)
+            chunk[col] = part.to_numpy(zero_copy_only=False)
+    else:
+        parts = source.str.split(step["sep"])
+        for i, col in enumerate(into):
+            chunk[col] = parts.str.get(i)
+
+    invalid = source.isna() | chunk[into[-1]].isna()
+    if invalid.any():
+        logger.warning(
+            f"Found {int(invalid.sum())} rows with invalid {step['column']} values"  # noqa
+        )
+    return chunk
+
+
+def _constant(chunk: pd.DataFrame, step: dict, context: dict) -> pd.DataFrame:
+    """Add a column holding one value, stored as a single category."""
+    value = step["value"]
+    if isinstance(value, str):
+        value = value.format(**context)
+    chunk[step["column"]] = pd.Categorical.from_codes(
+        np.zeros(len(chunk), dtype=np.int8), categories=[value]
+    )
+    return chunk
+
+
+def _rename(chunk: pd.DataFrame, step: dict, context: dict) -> pd.DataFrame:
+    return chunk.rename(columns=step["columns"])
+
+
+def _filter(chunk: pd.DataFrame, step: dict, context: dict) -> pd.DataFrame:
+    """Keep the rows whose column is in values (not in, with exclude), or
+    without values, the rows where it is not missing."""
+    column = chunk[step["column"]]
+    if "values" in step:
+        keep = column.isin(step["values"])
+        if step.get("exclude", False):
+            keep = ~keep
+    else:
+        keep = column.notna()
+    if keep.all():
+        return chunk
+    return chunk[keep.to_numpy()]
+
+
+transforms = {
+    "split": _split,
+    "constant": _constant,
+    "rename": _rename,
+    "filter": _filter,
+}
+
+
+class ChunkTransform:
+    """Pipeline of column transforms, checked once against the header and
+    then applied to every chunk of a file.
+
+    Steps are plain dicts, see `chunk_transforms` in src/columns.py:
+
+        {"op": "split", "column": c, "sep": "_", "into": [c1, c2, ...]}
+        {"op": "constant", "column": c, "value": "{product_code}"}
+        {"op": "rename", "columns": {old: new}}
+        {"op": "filter", "column": c, "values": [...], "exclude": False}
+
+    String values of constant columns are formatted with the context passed
+    to the pipeline, e.g. the product code of the file.
+
+    Args:
+        steps (list[dict]): Transforms, applied in order
+        columns (list[str]): Columns of the parsed chunks
+    """
+
+    def __init__(self, steps: list[dict], columns: list[str]):
+        available = list(columns)
+        added = []
+        for step in steps:
+            op = step["op"]
+            if op not in transforms:
+                raise ValueError(f"Unknown transform: {op}")
+            if op in ("split", "filter") and step["column"] not in available:
+                raise ValueError(
+                    f"Column {step['column']} is needed by the {op} "
+                    "transform but is not parsed"
+                )
+
+            if op == "split":
+                new = list(step["into"])
+            elif op == "constant":
+                new = [step["column"]]
+            elif op == "rename":
+                available = [step["columns"].get(c, c) for c in available]
+                added = [step["columns"].get(c, c) for c in added]
+                continue
+            else:
+                continue
+            available += new
+            added += new
+
+        self.steps = [(transforms[step["op"]], step) for step in steps]
+        self.columns = available
+        self.added_columns = added
+        # parsed column -> its name after any renames
+        self.renamed = dict(zip(columns, available))
+
+    def __call__(self, chunk: pd.DataFrame, **context) -> pd.DataFrame:
+        for transform, step in self.steps:
+            chunk = transform(chunk, step, context)
+        return chunk
+
+
+def source_columns(steps: list[dict]) -> list[str]:
+    """Columns the transforms read, so they are parsed even if not kept."""
+    return [step["column"] for step in steps if step["op"] in ("split", "filter")]  # noqa
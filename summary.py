@@ -1,17 +1,20 @@
-from src.config import out_dir
-import pandas as pd
+import sys
+from src.config import out_dir, output_format, catalog_file
+from src.catalog import Catalog
+from src.sinks import get_sink
 
 
-def main():
-    df = pd.DataFrame()
-    for file in out_dir.glob("summary_*.csv"):
-        df_temp = pd.read_csv(file)
-        # add a column for the file name
-        df_temp["run_info"] = file.stem
-        df = pd.concat([df, df_temp])
+def main(scan: bool = False):
+    # the catalog is filled in by main.py as files are reduced or skipped;
+    # the output folders are only scanned to import outputs made before
+    # the catalog existed, when it is empty or when asked to with --scan
+    with Catalog(catalog_file) as catalog:
+        if scan or catalog.is_empty():
+            catalog.scan(out_dir, get_sink(output_format).suffix, missing_only=True)  # noqa
+        df = catalog.summary()
 
     df.to_csv(out_dir / "all_runs.csv", index=False)
 
 
 if __name__ == "__main__":
-    main()
+    main(scan="--scan" in sys.argv[1:])
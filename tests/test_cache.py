@@ -0,0 +1,50 @@
+from src.cache import RptCache
+from src.staging import Stager
+
+
+def make_rpt_files(folder, n, size):
+    folder.mkdir()
+    files = []
+    for i in range(n):
+        rpt_file = folder / f"RUN_{i}.rpt"
+        rpt_file.write_bytes(b"x" * size)
+        files.append(rpt_file)
+    return files
+
+
+def test_staged_entries_survive_a_smaller_cache(tmp_path):
+    rpt_files = make_rpt_files(tmp_path / "share", n=8, size=1000)
+    cache = RptCache(tmp_path / "cache", max_bytes=2500)
+
+    with Stager(tmp_path / "staging", 10_000, max_workers=4, cache=cache) as stager:  # noqa
+        futures = [stager.stage(rpt_file) for rpt_file in rpt_files]
+        local_copies = [future.result()["output"] for future in futures]
+
+        # nothing has been parsed yet, so every staged copy is still there
+        for local_copy, rpt_file in zip(local_copies, rpt_files):
+            with open(local_copy, "rb") as file:
+                assert file.read() == rpt_file.read_bytes()
+
+        for rpt_file in rpt_files:
+            stager.release(rpt_file)
+
+    # once released, the next fetch brings the cache back under its size
+    extra = make_rpt_files(tmp_path / "more", n=1, size=1000)[0]
+    cache.fetch(extra)
+    cached = [entry for entry in cache.cache_dir.iterdir() if entry.is_file()]
+    assert sum(entry.stat().st_size for entry in cached) <= 2500
+
+
+def test_unpin_counts_holders(tmp_path):
+    rpt_file = make_rpt_files(tmp_path / "share", n=1, size=1000)[0]
+    cache = RptCache(tmp_path / "cache", max_bytes=0)
+
+    entry, _ = cache.fetch(rpt_file, pin=True)
+    cache.fetch(rpt_file, pin=True)
+    cache.unpin(entry)
+    cache.evict(0)
+    assert entry.exists()
+
+    cache.unpin(entry)
+    cache.evict(0)
+    assert not entry.exists()
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from src.io import (
+    ReadaheadReader,
+    read_rpt_header,
+    split_rpt_ranges,
+    stream_rpt_file,
+    write_rpt,
+)
+
+
+def expected_rpt(df: pd.DataFrame, sort_on: str) -> str:
+    """What writing the whole frame at once looks like: sorted, missing
+    keys last, ties in input order."""
+    df = df.sort_values(sort_on, kind="stable", na_position="last")
+    return df.rpt.to_rpt().to_csv(
+        index=False, quoting=3, lineterminator=os.linesep
+    )
+
+
+@pytest.mark.parametrize(
+    "keys",
+    [
+        [3.0, np.nan, 1.0, 2.0, np.nan, 1.0, 5.0, np.nan, 0.5],
+        ["c", None, "a", "b", None, "a", "e", None, "0"],
+    ],
+    ids=["float", "str"],
+)
+@pytest.mark.parametrize("chunk_rows", [9, 4, 1])
+def test_write_rpt_sorts_missing_keys_last(tmp_path, keys, chunk_rows):
+    df = pd.DataFrame({"SPCODE": keys, "VALUE": range(len(keys))})
+    chunks = [
+        df.iloc[start : start + chunk_rows]  # noqa: E203
+        for start in range(0, len(df), chunk_rows)
+    ]
+    out_file = tmp_path / "out.rpt"
+
+    n_rows = write_rpt(chunks, out_file, block_rows=2, temp_dir=tmp_path)
+
+    assert n_rows == len(df)
+    with open(out_file, newline="") as file:
+        assert file.read() == expected_rpt(df, "SPCODE")
+
+
+def test_to_rpt_file_with_missing_keys(tmp_path):
+    df = pd.DataFrame({"SPCODE": [2.0, np.nan, 1.0], "VALUE": [1, 2, 3]})
+    out_file = tmp_path / "out.rpt"
+
+    df.rpt.to_rpt(out_file)
+
+    with open(out_file, newline="") as file:
+        assert file.read() == expected_rpt(df, "SPCODE")
+
+
+def test_readahead_stops_at_range_end(tmp_path):
+    rpt_file = tmp_path / "in.rpt"
+    lines = ["!,SPCODE,VALUE\n"] + [f"*,{i},{i * 2}\n" for i in range(1000)]
+    rpt_file.write_text("".join(lines))
+    _, data_start = read_rpt_header(rpt_file)
+    ranges = split_rpt_ranges(rpt_file, 3, data_start)
+
+    for start, end in ranges:
+        reader = ReadaheadReader(rpt_file, start, end, block_size=256)
+        with reader:
+            data = reader.read()
+            assert reader._file.tell() == end
+        with open(rpt_file, "rb") as file:
+            file.seek(start)
+            assert data == file.read(end - start)
+
+    plain = [
+        list(stream_rpt_file(rpt_file, byte_range=byte_range))
+        for byte_range in ranges
+    ]
+    ahead = [
+        list(stream_rpt_file(rpt_file, byte_range=byte_range, readahead_mb=1))
+        for byte_range in ranges
+    ]
+    for plain_chunks, ahead_chunks in zip(plain, ahead):
+        assert pd.concat(plain_chunks).equals(pd.concat(ahead_chunks))
@@ -1,26 +1,59 @@
 # zip up all the files ending with csv in the out_dir
+import os
 import zipfile
-from src.config import out_dir
-from src.logger import logger
-
-# Get all combined files in the out_dir folder
-files = list(out_dir.glob("combined_*.csv"))
-logger.info(f"Found {len(files)} combined CSV files to compress")
-
-# Create a zip file for each combined file
-for file in files:
-    # Create zip filename based on the original file name
-    zip_file_name = f"{file.stem}.zip"
-    zip_file_path = out_dir / zip_file_name
-
-    # Create a zip file with maximum compression
-    with zipfile.ZipFile(
-        zip_file_path,
-        "w",
-        compression=zipfile.ZIP_DEFLATED,
-        compresslevel=9,  # Maximum compression level
-    ) as zipf:
-        logger.info(f"Compressing {file.name}")
-        zipf.write(file, file.name)
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from src.config import out_dir, log_dir, log_level, zip_level, zip_workers
+from src.logger import logger, setup_logger
+from src.sidecar import temp_path
 
+
+def zip_file(file: Path, level: int = zip_level) -> Path:
+    """
+    Compress a file into a zip archive next to it.
+
+    The archive is written under a temporary name and renamed once
+    complete, so an interrupted run never leaves a truncated zip behind.
+
+    Args:
+        file: File to compress
+        level: DEFLATE level, from 1 (fastest) to 9 (smallest)
+
+    Returns:
+        Path: The zip file
+    """
+    zip_file_path = file.with_suffix(".zip")
+    tmp_file = temp_path(zip_file_path)
+    logger.info(f"Compressing {file.name}")
+    try:
+        with zipfile.ZipFile(
+            tmp_file,
+            "w",
+            compression=zipfile.ZIP_DEFLATED,
+            compresslevel=level,
+        ) as zipf:
+            zipf.write(file, file.name)
+        os.replace(tmp_file, zip_file_path)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
     logger.info(f"Compressed {file.name} to {zip_file_path}")
+    return zip_file_path
+
+
+if __name__ == "__main__":
+    setup_logger(logger.name, log_dir, log_level)
+
+    # Get all combined files in the out_dir folder
+    files = list(out_dir.glob("combined_*.csv"))
+    logger.info(f"Found {len(files)} combined CSV files to compress")
+
+    # zlib releases the GIL while compressing, so threads compress several
+    # files at once
+    with ThreadPoolExecutor(max_workers=zip_workers) as executor:
+        futures = {executor.submit(zip_file, file): file for file in files}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to compress {futures[future].name}: {e}")